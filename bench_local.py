@@ -0,0 +1,121 @@
+# bench_local.py  –  run bench_relay.py at 1, 2, 4 and N gateway processes
+#
+# No Chromium, Postgres or docker compose stack needed – only a Redis server
+# and the gateway's requirements (pip install -r gateway/requirements.txt).
+# It starts
+#
+#   * a stub worker  – answers every CDP call on ws://127.0.0.1:5000/proxy/<id>
+#                      with a Browser.getVersion-sized reply
+#   * the gateway    – gateway/serve.py with GATEWAY_PROCESSES=n
+#
+# seeds SESSIONS keep-alive sessions straight into Redis (no tenant, so no
+# quota / DB lookups on the relay path) and runs bench_relay.py against them
+# once per process count.  Prints a markdown table for the README.
+#
+#   docker run --rm -d -p 6379:6379 redis:7-alpine
+#   python bench_local.py                      # PROCS=1,2,4,<cpu count>
+#   REDIS_URL=redis://redis-host:6379/15 PROCS=1,2,4,8 python bench_local.py
+#
+# The Redis database must be empty: the harness flushes it between runs.
+# Client, stub worker and gateway share the box, so give it more cores than
+# the largest process count; this measures the gateway's relay path (two
+# WebSocket hops + a Redis write per message), not a real deployment.
+import asyncio, json, multiprocessing, os, re, socket, subprocess, sys, time, uuid
+
+import redis
+
+ROOT     = os.path.dirname(os.path.abspath(__file__))
+PROCS    = sorted({int(n) for n in os.environ.get("PROCS", f"1,2,4,{os.cpu_count() or 1}").split(",")})
+SESSIONS = int(os.environ.get("SESSIONS", "32"))
+PORT     = int(os.environ.get("PORT", "8000"))
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/15")
+_REPLY   = {"protocolVersion": "1.3", "product": "HeadlessChrome/126.0.6478.126",
+            "revision": "@" + "0" * 40, "jsVersion": "12.6.228.21",
+            "userAgent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+                         "(KHTML, like Gecko) HeadlessChrome/126.0.0.0 Safari/537.36"}
+
+
+def _stub_worker() -> None:
+    import websockets
+
+    async def reply(ws):
+        async for raw in ws:
+            await ws.send(json.dumps({"id": json.loads(raw)["id"], "result": _REPLY}))
+
+    async def serve():
+        async with websockets.serve(reply, "127.0.0.1", 5000, compression=None, max_size=None):
+            await asyncio.Future()
+
+    asyncio.run(serve())
+
+
+def _wait_port(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), 0.2).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"nothing listening on :{port}")
+
+
+def _seed(r: redis.Redis) -> list[str]:
+    r.flushdb()
+    sids = [str(uuid.uuid4()) for _ in range(SESSIONS)]
+    pipe = r.pipeline()
+    for sid in sids:
+        pipe.hset("session_map", sid, "127.0.0.1")
+        pipe.hset(f"session:{sid}", mapping={
+            "reservedAt": time.time(), "registeredAt": time.time(),
+            "browserId": uuid.uuid4().hex, "port": 9222, "keepAlive": 1, "grace": 3600,
+        })
+    pipe.execute()
+    return sids
+
+
+def _run(n: int, sids: list[str]) -> dict:
+    env = {**os.environ, "PYTHONPATH": "gateway", "REDIS_URL": REDIS_URL,
+           "GATEWAY_PROCESSES": str(n), "GATEWAY_SCHEMA_READY": "1",
+           "PORT": str(PORT), "LOG_LEVEL": "warning"}
+    gw = subprocess.Popen([sys.executable, "gateway/serve.py"], cwd=ROOT, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_port(PORT)
+        time.sleep(2 + n)                       # let every process finish start-up
+        out = subprocess.run(
+            [sys.executable, "bench_relay.py"], cwd=ROOT, check=True, capture_output=True, text=True,
+            env={**os.environ, "GATEWAY_URL": f"http://127.0.0.1:{PORT}", "SESSION_IDS": ",".join(sids)},
+        ).stdout
+    finally:
+        gw.terminate()
+        gw.wait(30)
+    print(out, end="", file=sys.stderr)
+    return {k: float(v) for k, v in re.findall(r"^(msgs/s|MB/s down|p50 ms|p99 ms)\s+([\d.]+)", out, re.M)}
+
+
+def main() -> None:
+    r = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    if r.dbsize():
+        sys.exit(f"{REDIS_URL} is not empty; point REDIS_URL at a spare database")
+    worker = multiprocessing.Process(target=_stub_worker, daemon=True)
+    worker.start()
+    _wait_port(5000)
+
+    rows = []
+    for n in PROCS:
+        sids = _seed(r)                         # fresh sessions: a run leaves them parked
+        print(f"── {n} process(es)", file=sys.stderr)
+        rows.append((n, _run(n, sids)))
+    r.flushdb()
+
+    print(f"\n{os.cpu_count()} CPU(s), {SESSIONS} sessions, Redis {r.info('server')['redis_version']}\n")
+    print("| Processes | msgs/s | MB/s down | p50 ms | p99 ms |")
+    print("|----------:|-------:|----------:|-------:|-------:|")
+    for n, r in rows:
+        print(f"| {n} | {r.get('msgs/s', 0):.0f} | {r.get('MB/s down', 0):.2f} "
+              f"| {r.get('p50 ms', 0):.2f} | {r.get('p99 ms', 0):.2f} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# bench_relay.py  –  CDP relay throughput through the gateway
+#
+# Opens SESSIONS browser sessions, then hammers each connectUrl with
+# pipelined browser-level CDP calls (no page work, so Chromium is cheap and
+# the gateway relay is the bottleneck) for DURATION seconds.
+#
+#   GATEWAY_PROCESSES=1 docker compose up -d gateway && python bench_relay.py
+#   GATEWAY_PROCESSES=4 docker compose up -d gateway && python bench_relay.py
+#
+# Compare msgs/s across runs; keep SESSIONS ≥ 4× the process count so every
+# process has connections to serve.  SESSION_IDS=a,b,… drives existing
+# sessions instead of creating (and deleting) its own – bench_local.py
+# uses that to run the sweep without Chromium or Postgres.
+import asyncio, json, os, statistics, time
+import aiohttp, websockets
+
+GATEWAY  = os.environ.get("GATEWAY_URL", "http://localhost:8000")
+SESSIONS = int(os.environ.get("SESSIONS", "32"))
+INFLIGHT = int(os.environ.get("INFLIGHT", "16"))          # pipelined calls per socket
+DURATION = float(os.environ.get("DURATION", "20"))
+METHOD   = os.environ.get("METHOD", "Browser.getVersion")  # SystemInfo.getInfo → bigger replies
+SESSION_IDS = [s for s in os.environ.get("SESSION_IDS", "").split(",") if s]
+HEADERS  = {"Authorization": f"Bearer {os.environ['AUTH_TOKEN']}"} if os.environ.get("AUTH_TOKEN") else {}
+
+
+async def drive(url: str, deadline: float, lat: list, stats: dict) -> None:
+    async with websockets.connect(url, max_size=None, compression=None,
+                                  extra_headers=HEADERS) as ws:
+        sent_at: dict[int, float] = {}
+        next_id = 0
+
+        async def send_one():
+            nonlocal next_id
+            next_id += 1
+            sent_at[next_id] = time.perf_counter()
+            await ws.send(json.dumps({"id": next_id, "method": METHOD}))
+
+        for _ in range(INFLIGHT):
+            await send_one()
+        while sent_at:
+            raw = await ws.recv()
+            msg = json.loads(raw)
+            t0 = sent_at.pop(msg.get("id"), None)
+            if t0 is None:
+                continue                    # an event, not a reply
+            lat.append(time.perf_counter() - t0)
+            stats["msgs"] += 1
+            stats["bytes"] += len(raw)
+            if time.perf_counter() < deadline:
+                await send_one()
+
+
+async def main() -> None:
+    if SESSION_IDS:
+        ws_base = GATEWAY.replace("http", "ws", 1)
+        sessions = [{"sessionId": sid, "connectUrl": f"{ws_base}/session/{sid}"}
+                    for sid in SESSION_IDS]
+    else:
+        async with aiohttp.ClientSession(headers=HEADERS) as http:
+            r = await http.post(f"{GATEWAY}/sessions:batch", json={"count": SESSIONS})
+            r.raise_for_status()
+            sessions = [s for s in (await r.json())["sessions"] if "connectUrl" in s]
+    print(f"{len(sessions)} sessions, {INFLIGHT} in flight each, {METHOD}, {DURATION:.0f}s")
+
+    lat: list[float] = []
+    stats = {"msgs": 0, "bytes": 0}
+    t0 = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            drive(s["connectUrl"], t0 + DURATION, lat, stats) for s in sessions
+        ))
+    finally:
+        elapsed = time.perf_counter() - t0
+        if not SESSION_IDS:
+            async with aiohttp.ClientSession(headers=HEADERS) as http:
+                await asyncio.gather(*(
+                    http.delete(f"{GATEWAY}/sessions/{s['sessionId']}") for s in sessions
+                ), return_exceptions=True)
+
+    lat.sort()
+    print(f"msgs/s     {stats['msgs'] / elapsed:10.0f}")
+    print(f"MB/s down  {stats['bytes'] / elapsed / 1e6:10.2f}")
+    if lat:
+        print(f"p50 ms     {statistics.median(lat) * 1e3:10.2f}")
+        print(f"p99 ms     {lat[int(len(lat) * 0.99) - 1] * 1e3:10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,21 +1,33 @@
 # gateway/app.py
-from fastapi import FastAPI, WebSocket, status, Depends, Request
+from fastapi import FastAPI, WebSocket, status, Depends, Request, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
 import asyncio
+import os
 import uuid
-from pydantic import BaseModel
+from datetime import datetime, timedelta, timezone
+from pydantic import BaseModel, Field
 
 from sqlalchemy import select
 from db import get_session
 from models import BrowserSession
-from schema import SessionList        #  <-- NEW
+from schema import SessionList, LaunchProfile
 
 
 from db import create_schema                      # auto-DDL
 from session_manager import (
     create_session,
+    create_sessions,
     close_browser,
     start_background_tasks,
+    stop_background_tasks,
+    NoCapacityError,
+    TenantLimitError,
+    TENANT_LIMIT_MSG,
 )
+import metrics
+import quotas
+import ws_compression
+import usage
 from cdp_proxy import proxy_cdp
 from session_manager import redis
 from middleware.tenant import TenantMiddleware
@@ -24,9 +36,14 @@ from middleware.tenant import TenantMiddleware
 # Lifespan hook: create tables *then* launch the idle/absolute-timeout sweeper
 # --------------------------------------------------------------------------- #
 async def lifespan(app: FastAPI):
-    await create_schema()                                   # 1️⃣ ensure tables
-    start_background_tasks(asyncio.get_running_loop())      # 2️⃣ start sweeper
-    yield                                                   # 3️⃣ shutdown handled automatically
+    if ws_compression.ENABLED and os.getenv("GATEWAY_ENTRYPOINT") != "serve.py":
+        print("[gateway] WARNING: not started via serve.py – the CDP socket uses "
+              "uvicorn's stock permessage-deflate and WS_DEFLATE_* are ignored")
+    if not os.getenv("GATEWAY_SCHEMA_READY"):               # serve.py did it once already
+        await create_schema()                               # 1️⃣ ensure tables
+    start_background_tasks(asyncio.get_running_loop())      # 2️⃣ start sweeper (leader only)
+    yield
+    await stop_background_tasks()                           # 3️⃣ hand over leadership
 
 
 app = FastAPI(title="Browser Gateway", lifespan=lifespan)
@@ -35,8 +52,24 @@ app.add_middleware(TenantMiddleware)
 def current_tenant(request: Request) -> uuid.UUID:
     return request.state.tenant_id
 
+@app.exception_handler(quotas.QuotaExceeded)
+async def quota_exceeded(request: Request, exc: quotas.QuotaExceeded):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": str(exc), "scope": exc.scope},
+        headers=exc.headers(),
+    )
+
 class NewSessionReq(BaseModel):
     record: bool = False                 # 🆕 default: not recording
+    keep_alive: bool = False             # survive client disconnects …
+    grace_period: int | None = Field(    # … for this many seconds
+        None, ge=0, description="defaults to DETACH_GRACE_PERIOD",
+    )
+    profile: LaunchProfile | None = None
+
+class NewSessionBatchReq(NewSessionReq):
+    count: int = Field(..., ge=1, le=500)
 
 # ---------- REST API ---------- #
 @app.post("/sessions", status_code=status.HTTP_201_CREATED)
@@ -44,28 +77,90 @@ async def new_session(
         payload: NewSessionReq,
         tenant_id: uuid.UUID = Depends(current_tenant)
     ):
-    info = await create_session(
-        tenant_id=tenant_id             
-    )
+    limits = await quotas.get_limits(tenant_id)
+    await quotas.check_create(tenant_id, limits)
+    try:
+        info = await create_session(
+            tenant_id=tenant_id,
+            keep_alive=payload.keep_alive,
+            grace_period=payload.grace_period,
+            profile=payload.profile.model_dump() if payload.profile else None,
+            tenant_max=limits.max_sessions,
+        )
+    except Exception as exc:
+        await quotas.refund_create(tenant_id, limits)    # only real sessions are charged
+        if isinstance(exc, TenantLimitError):
+            raise await quotas.session_limit_exceeded(tenant_id, limits)
+        if isinstance(exc, NoCapacityError):
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(exc))
+        raise
     return {
         "sessionId":  info["session_id"],
         "connectUrl": info["connect_url"],
     }
 
+@app.post("/sessions:batch", status_code=status.HTTP_201_CREATED)
+async def new_sessions(
+        payload: NewSessionBatchReq,
+        tenant_id: uuid.UUID = Depends(current_tenant)
+    ):
+    """
+    Create `count` sessions in one scheduling pass.  Items fail individually
+    (their capacity is released); 429/503 only if none could be created.
+    The whole batch is charged against the create-rate bucket up front;
+    items that fail are refunded.
+    """
+    limits = await quotas.get_limits(tenant_id)
+    await quotas.check_create(tenant_id, limits, payload.count)
+    try:
+        items = await create_sessions(
+            tenant_id=tenant_id,
+            count=payload.count,
+            keep_alive=payload.keep_alive,
+            grace_period=payload.grace_period,
+            profile=payload.profile.model_dump() if payload.profile else None,
+            tenant_max=limits.max_sessions,
+        )
+    except Exception:
+        await quotas.refund_create(tenant_id, limits, payload.count)
+        raise
+    created = sum("connect_url" in i for i in items)
+    await quotas.refund_create(tenant_id, limits, payload.count - created)
+    if not created and all(i["error"] == TENANT_LIMIT_MSG for i in items):
+        raise await quotas.session_limit_exceeded(tenant_id, limits)
+    if not created:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail=items[0]["error"])
+    return {
+        "created": created,
+        "failed":  len(items) - created,
+        "sessions": [
+            {"sessionId": i["session_id"], "connectUrl": i["connect_url"]}
+            if "connect_url" in i else
+            {"sessionId": i["session_id"], "error": i["error"]}
+            for i in items
+        ],
+    }
+
 @app.get("/sessions", response_model=SessionList)
 async def list_sessions(
-    tenant_id: uuid.UUID = Depends(current_tenant)
+    tenant_id: uuid.UUID = Depends(current_tenant),
+    days: int | None = Query(
+        None, ge=1, description="only sessions created in the last N days (default: all)",
+    ),
 ):
     """
-    Return all sessions that belong to the authenticated tenant.
+    Return the sessions that belong to the authenticated tenant, newest
+    first.  Pass `days` to keep the scan to the newest partitions; older
+    history is archived to MinIO either way.
     """
+    stmt = select(BrowserSession).where(BrowserSession.tenant_id == tenant_id)
+    if days is not None:
+        since = datetime.now(tz=timezone.utc) - timedelta(days=days)
+        stmt = stmt.where(BrowserSession.created_at >= since)
     async with get_session() as db:
         rows = (
-            await db.execute(
-                select(BrowserSession)
-                .where(BrowserSession.tenant_id == tenant_id)
-                .order_by(BrowserSession.created_at.desc())
-            )
+            await db.execute(stmt.order_by(BrowserSession.created_at.desc()))
         ).scalars().all()
 
     # rows are BrowserSession instances; Pydantic takes care of conversion
@@ -77,6 +172,49 @@ async def delete_session(session_id: str):
     return {"status": "closed"}
 
 
+@app.get("/limits")
+async def tenant_limits(tenant_id: uuid.UUID = Depends(current_tenant)):
+    """The caller's effective quotas and current concurrent-session count."""
+    limits = await quotas.get_limits(tenant_id)
+    active = await redis.scard(f"{quotas.settings.redis_tenant_sessions_prefix}{tenant_id}")
+    return {**vars(limits), "active_sessions": active}
+
+
+def _utc(ts: datetime) -> datetime:
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts
+
+@app.get("/usage")
+async def tenant_usage(
+    tenant_id: uuid.UUID = Depends(current_tenant),
+    since: datetime | None = Query(None, description="default: 24 h ago"),
+    until: datetime | None = Query(None, description="default: now"),
+    granularity: str = Query("hour", pattern="^(hour|day)$"),
+):
+    """Sessions, browser-seconds and relayed bytes per hour or UTC day."""
+    until = _utc(until) if until else datetime.now(tz=timezone.utc)
+    since = _utc(since) if since else until - timedelta(days=1)
+    buckets = await usage.query(redis, tenant_id, since, until, granularity)
+    return {
+        "since": since,
+        "until": until,
+        "granularity": granularity,
+        "buckets": buckets,
+        "total": {f: sum(b[f] for b in buckets) for f in usage.FIELDS},
+    }
+
+
+# ---------- capacity / autoscaling ---------- #
+@app.get("/capacity")
+async def cluster_capacity():
+    """Free slots, create/close rates, rejections and a worker forecast."""
+    return await metrics.capacity(redis)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    # one read of stats:totals serves both the gauges and the counters
+    return metrics.prometheus(*await metrics.capacity_and_totals(redis))
+
+
 # ---------- WebSocket CDP proxy ---------- #
 @app.websocket("/session/{session_id}")
 async def ws_proxy(websocket: WebSocket, session_id: str):
@@ -2,15 +2,26 @@
 CDP WebSocket proxy – now reads per-session debug PORT from Redis.
 """
 import asyncio
+import uuid
 import websockets
 from fastapi import WebSocket, WebSocketDisconnect
 
-from session_manager import touch_session, close_browser, redis, get_settings
+from session_manager import (
+    touch_session, attach_client, detach_client, redis, get_settings,
+)
+from quotas import CdpThrottle, get_limits
+from usage import ByteMeter
 settings = get_settings()
 
+def _size(msg: str | bytes) -> int:
+    # UTF-8 length without encoding the (usually ASCII) CDP JSON
+    if isinstance(msg, bytes) or msg.isascii():
+        return len(msg)
+    return len(msg.encode())
+
 async def _open_remote_ws(worker: str, port: str, browser_guid: str):
     url = f"ws://{worker}:{port}/devtools/browser/{browser_guid}"
-    return await websockets.connect(url, ping_interval=None, max_size=None)
+    return await websockets.connect(url, ping_interval=None, max_size=None, compression=None)
 
 async def proxy_cdp(websocket: WebSocket, session_id: str) -> None:
     await websocket.accept()
@@ -20,29 +31,43 @@ async def proxy_cdp(websocket: WebSocket, session_id: str) -> None:
         return
 
     sess_key = f"session:{session_id}"
-    browser_id = await redis.hget(sess_key, "browserId")
+    browser_id, tenant = await redis.hmget(sess_key, "browserId", "tenant")
     if not browser_id:
         await websocket.close(code=1011, reason="target missing")
         return
+    throttle = CdpThrottle(tenant, await get_limits(uuid.UUID(tenant))) if tenant else None
+    meter = ByteMeter(redis, tenant) if tenant else None
 
     try:
         remote_ws = await websockets.connect(
             f"ws://{worker}:5000/proxy/{session_id}",    # hop #2 goes to worker
-            ping_interval=None, max_size=None
+            ping_interval=None, max_size=None,
+            compression=None,       # LAN hop: deflate would only burn CPU twice
         )
     except Exception as e:
         await websocket.close(code=1011, reason=f"cannot connect to Chrome: {e}")
         return
 
+    # reattaching within the grace period lands here as well
+    attach_gen = await attach_client(session_id)
+    if attach_gen is None:                  # closed while we were connecting
+        await remote_ws.close()
+        await websocket.close(code=4404)
+        return
+
     async def client_to_browser():
         try:
             async for msg in websocket.iter_text():
+                if throttle:
+                    await throttle.acquire()        # back-pressure, never drop
                 await remote_ws.send(msg)
                 await touch_session(session_id)
+                if meter:
+                    await meter.add(_size(msg))
         except WebSocketDisconnect:
             pass
         finally:
-            await close_browser(session_id, reason="client_disconnect")
+            await detach_client(session_id, attach_gen)
             await remote_ws.close()
 
     async def browser_to_client():
@@ -50,9 +75,13 @@ async def proxy_cdp(websocket: WebSocket, session_id: str) -> None:
             async for msg in remote_ws:
                 await websocket.send_text(msg)
                 await touch_session(session_id)
+                if meter:
+                    await meter.add(_size(msg))
         except Exception:
             pass
         finally:
             await websocket.close()
 
     await asyncio.gather(client_to_browser(), browser_to_client(), return_exceptions=True)
+    if meter:
+        await meter.flush()
@@ -28,7 +28,16 @@ settings = get_settings()
 # --------------------------------------------------------------------------- #
 
 DB_URL = settings.database_url.replace("postgresql://", "postgresql+asyncpg://")
-engine = create_async_engine(DB_URL, echo=False, pool_size=5, max_overflow=10)
+
+# DB_MAX_CONNECTIONS is the budget for the whole gateway (keep it below the
+# server's max_connections); each uvicorn process gets an equal share.
+_per_process = max(2, settings.db_max_connections // max(1, settings.gateway_processes))
+POOL_SIZE = max(1, _per_process // 3)
+MAX_OVERFLOW = _per_process - POOL_SIZE
+
+engine = create_async_engine(
+    DB_URL, echo=False, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_pre_ping=True,
+)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
 Base = declarative_base()
@@ -49,12 +58,26 @@ async def get_session() -> AsyncSession:
 # One-shot auto-migration
 # --------------------------------------------------------------------------- #
 
+_SCHEMA_LOCK = 0x62726F77          # arbitrary, shared by every gateway
+
+
 async def create_schema() -> None:
     """
     Auto-creates *all* tables defined on `Base`.  No-op if they already exist.
     Called once by FastAPI's lifespan event (see gateway/app.py).
+
+    Also converts an unpartitioned `browser_sessions` from older releases and
+    makes sure today's (and the next few days') partitions exist.
     """
+    from partitions import adopt_legacy_rows, ensure_partitions, migrate_legacy_table
+
     async with engine.begin() as conn:
         # Optionally set search_path etc. here:
         # await conn.execute(text('SET search_path TO public'))
+        # replicas starting together take turns; the lock ends with the transaction
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _SCHEMA_LOCK})
+        legacy = await migrate_legacy_table(conn)
         await conn.run_sync(Base.metadata.create_all)
+        await ensure_partitions(conn)
+        if legacy:
+            await adopt_legacy_rows(conn)
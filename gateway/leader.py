@@ -0,0 +1,84 @@
+"""
+Redis-lease leader election for work that must run once per cluster
+(timeout sweeper, reconciler, …) no matter how many gateway replicas or
+uvicorn workers are up.
+
+The leader renews its lease every `ttl / 3` seconds; if it dies, another
+replica takes over within one TTL.
+"""
+# gateway/leader.py
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+import uuid
+
+import redis.asyncio as aioredis
+
+# KEYS: lease key   ARGV: token, ttl_ms
+# Returns 1 if we hold the lease after the call (renewed or freshly taken).
+_ACQUIRE_LUA = """
+local cur = redis.call('GET', KEYS[1])
+if cur == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+if not cur then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# KEYS: lease key   ARGV: token  – only the holder may delete the lease
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderLease:
+    def __init__(self, redis: aioredis.Redis, name: str, ttl: float) -> None:
+        self.key = f"leader:{name}"
+        self.ttl = ttl
+        # unique per process, readable in `redis-cli GET leader:<name>`
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._acquire = redis.register_script(_ACQUIRE_LUA)
+        self._release = redis.register_script(_RELEASE_LUA)
+        self._is_leader = False
+        self._task: asyncio.Task | None = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._is_leader
+
+    async def _campaign(self) -> None:
+        while True:
+            try:
+                held = bool(await self._acquire(
+                    keys=[self.key], args=[self.token, int(self.ttl * 1000)],
+                ))
+            except Exception as exc:
+                # can't prove we still hold it → step down until Redis is back
+                print(f"[leader] {self.key}: {exc}")
+                held = False
+            if held != self._is_leader:
+                print(f"[leader] {self.token} {'acquired' if held else 'lost'} {self.key}")
+            self._is_leader = held
+            await asyncio.sleep(self.ttl / 3)
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._task is None:
+            self._task = loop.create_task(self._campaign())
+
+    async def stop(self) -> None:
+        """Step down and hand the lease over immediately (graceful shutdown)."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._is_leader:
+            self._is_leader = False
+            await self._release(keys=[self.key], args=[self.token])
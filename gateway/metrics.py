@@ -0,0 +1,166 @@
+"""
+Cluster capacity metrics, kept incrementally in Redis.
+
+Every create / close / rejection bumps a per-minute bucket (and a lifetime
+total), so sliding-window rates are a handful of MGETs – no table scans –
+and every gateway process / replica sees the same numbers.
+
+    stats:<event>:<epoch-minute>   counter, expires after the longest window
+    stats:totals                   hash event → lifetime count (Prometheus)
+"""
+# gateway/metrics.py
+from __future__ import annotations
+
+import math
+import os
+import time
+
+from config import get_settings, Settings
+
+settings: Settings = get_settings()
+
+WINDOWS = {"1m": 1, "5m": 5, "15m": 15}          # label → minutes
+_BUCKET_TTL = 60 * (max(WINDOWS.values()) + 2)
+
+# fraction of spare capacity the forecast keeps on top of demand
+HEADROOM: float = float(os.getenv("CAPACITY_HEADROOM", "0.2"))
+DEFAULT_CAPACITY: int = int(os.getenv("MAX_CONTEXTS", "20"))    # workers that don't publish one
+
+
+def _minute(ts: float | None = None) -> int:
+    return int((ts or time.time()) // 60)
+
+
+async def record(redis, event: str, n: float = 1) -> None:
+    """Count `n` occurrences of `event` (created, closed, rejected, …)."""
+    key = f"stats:{event}:{_minute()}"
+    pipe = redis.pipeline(transaction=False)
+    if isinstance(n, float):
+        pipe.incrbyfloat(key, n)
+        pipe.hincrbyfloat("stats:totals", event, n)
+    else:
+        pipe.incrby(key, n)
+        pipe.hincrby("stats:totals", event, n)
+    pipe.expire(key, _BUCKET_TTL)
+    await pipe.execute()
+
+
+async def window_sums(redis, events: list[str]) -> dict[str, dict[str, float]]:
+    """event → {window label → sum over the last N *complete-ish* minutes}."""
+    now = _minute()
+    longest = max(WINDOWS.values())
+    keys = [f"stats:{e}:{m}" for e in events for m in range(now - longest + 1, now + 1)]
+    values = [float(v or 0) for v in await redis.mget(keys)]
+
+    out: dict[str, dict[str, float]] = {}
+    for i, e in enumerate(events):
+        per_minute = values[i * longest:(i + 1) * longest]     # oldest … newest
+        out[e] = {label: sum(per_minute[-m:]) for label, m in WINDOWS.items()}
+    return out
+
+
+async def capacity(redis) -> dict:
+    """Free slots per worker / cluster, rates, rejections and a forecast."""
+    return (await capacity_and_totals(redis))[0]
+
+
+async def capacity_and_totals(redis) -> tuple[dict, dict[str, str]]:
+    """`capacity()` plus the raw lifetime totals it was computed from."""
+    pipe = redis.pipeline(transaction=False)
+    pipe.zrange(settings.redis_workers_load_key, 0, -1, withscores=True)
+    pipe.hgetall(settings.redis_workers_capacity_key)
+    pipe.hgetall(settings.redis_workers_state_key)
+    pipe.hgetall("stats:totals")
+    loads, caps, states, totals = await pipe.execute()
+
+    workers = []
+    for w, load in loads:
+        cap = int(caps.get(w, DEFAULT_CAPACITY))
+        state = states.get(w)
+        workers.append({
+            "worker": w,
+            "capacity": cap,
+            "used": int(load),
+            "free": 0 if state else max(cap - int(load), 0),
+            "state": state or "ready",
+        })
+
+    sums = await window_sums(redis, ["created", "closed", "rejected", "duration_s"])
+    rates = {
+        e: {label: sums[e][label] / (m * 60) for label, m in WINDOWS.items()}
+        for e in ("created", "closed")
+    }
+
+    # Little's law: concurrent demand ≈ arrival rate × mean session duration
+    closed_15 = sums["closed"]["15m"]
+    mean_duration = sums["duration_s"]["15m"] / closed_15 if closed_15 else None
+    arrival = rates["created"]["5m"]
+    used = sum(x["used"] for x in workers)
+    per_worker = (sum(x["capacity"] for x in workers) / len(workers)) if workers else DEFAULT_CAPACITY
+    demand = max(arrival * mean_duration if mean_duration else 0.0, used)
+    required = math.ceil(demand * (1 + HEADROOM) / per_worker) if demand else 0
+
+    raw, wire = float(totals.get("ws_raw_bytes", 0)), float(totals.get("ws_wire_bytes", 0))
+    return {
+        "workers": workers,
+        "total": {
+            "workers": len(workers),
+            "schedulable_workers": sum(1 for x in workers if x["state"] == "ready"),
+            "capacity": sum(x["capacity"] for x in workers),
+            "used": used,
+            "free": sum(x["free"] for x in workers),
+        },
+        "rates_per_s": rates,
+        "rejected": {**sums["rejected"], "total": float(totals.get("rejected", 0))},
+        "ws_compression": {                   # client-facing sockets that negotiated deflate
+            "raw_bytes": raw,
+            "wire_bytes": wire,
+            "saved_ratio": 1 - wire / raw if raw else 0.0,
+        },
+        "forecast": {
+            "arrival_rate_per_s": arrival,
+            "mean_session_s": mean_duration,
+            "expected_concurrent": demand,
+            "headroom": HEADROOM,
+            "required_workers": required,
+        },
+    }, totals
+
+
+def prometheus(cap: dict, totals: dict[str, str]) -> str:
+    """Render `capacity()` + lifetime totals in the Prometheus text format."""
+    lines = [
+        "# TYPE browser_workers gauge",
+        f"browser_workers {cap['total']['workers']}",
+        "# TYPE browser_workers_schedulable gauge",
+        f"browser_workers_schedulable {cap['total']['schedulable_workers']}",
+        "# TYPE browser_slots gauge",
+    ]
+    for k in ("capacity", "used", "free"):
+        lines.append(f'browser_slots{{kind="{k}"}} {cap["total"][k]}')
+    lines.append("# TYPE browser_worker_free_slots gauge")
+    for w in cap["workers"]:
+        lines.append(
+            f'browser_worker_free_slots{{worker="{w["worker"]}",state="{w["state"]}"}} {w["free"]}'
+        )
+    lines.append("# TYPE browser_session_rate gauge")
+    for event, by_window in cap["rates_per_s"].items():
+        for label, v in by_window.items():
+            lines.append(f'browser_session_rate{{event="{event}",window="{label}"}} {v:.4f}')
+    for event, v in sorted(totals.items()):
+        if event == "duration_s":
+            continue
+        lines.append(f"# TYPE browser_{event}_total counter")
+        lines.append(f"browser_{event}_total {float(v):g}")
+    lines += [
+        "# TYPE browser_ws_compression_saved_ratio gauge",
+        f"browser_ws_compression_saved_ratio {cap['ws_compression']['saved_ratio']:.4f}",
+    ]
+    f = cap["forecast"]
+    lines += [
+        "# TYPE browser_expected_concurrent_sessions gauge",
+        f"browser_expected_concurrent_sessions {f['expected_concurrent']:.2f}",
+        "# TYPE browser_required_workers gauge",
+        f"browser_required_workers {f['required_workers']}",
+    ]
+    return "\n".join(lines) + "\n"
@@ -2,13 +2,16 @@
 Single SQLAlchemy model that mirrors the old `browser_sessions` table.
 Additional columns?  Add them here once and they’ll migrate automatically on
 next start (for simple additions; for complex DDL use Alembic later).
+
+`browser_sessions` is range-partitioned by day on `created_at` (see
+partitions.py), so the partition key is part of the primary key.
 """
 # gateway/models.py
 
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, DateTime, Text
+from sqlalchemy import BigInteger, Column, DateTime, Float, Index, Integer, Text, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped
 
@@ -17,6 +20,12 @@ from db import Base
 
 class BrowserSession(Base):
     __tablename__ = "browser_sessions"
+    __table_args__ = (
+        # the sweeper's absolute-timeout scan only ever wants live rows
+        Index("ix_browser_sessions_active", "created_at",
+              postgresql_where=text("status = 'active'")),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     session_id: Mapped[uuid.UUID] = Column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
@@ -29,7 +38,7 @@ class BrowserSession(Base):
     created_at: Mapped[datetime] = Column(
         DateTime(timezone=True),
         default=lambda: datetime.now(tz=timezone.utc),
-        nullable=False,
+        primary_key=True,
     )
     last_active_at: Mapped[datetime] = Column(
         DateTime(timezone=True),
@@ -38,3 +47,26 @@ class BrowserSession(Base):
     )
     ended_at: Mapped[datetime | None] = Column(DateTime(timezone=True))
     status: Mapped[str] = Column(Text, default="active", nullable=False)
+
+
+class TenantLimits(Base):
+    """Per-tenant quota overrides; NULL → the TENANT_* env default, 0 → unlimited."""
+    __tablename__ = "tenant_limits"
+
+    tenant_id: Mapped[uuid.UUID] = Column(UUID(as_uuid=True), primary_key=True)
+    max_sessions: Mapped[int | None] = Column(Integer)
+    create_rate: Mapped[float | None] = Column(Float)
+    create_burst: Mapped[int | None] = Column(Integer)
+    cdp_rate: Mapped[float | None] = Column(Float)
+    cdp_burst: Mapped[int | None] = Column(Integer)
+
+
+class UsageRollup(Base):
+    """Hourly per-tenant usage, folded from Redis counters (see usage.py)."""
+    __tablename__ = "usage_rollups"
+
+    tenant_id: Mapped[uuid.UUID] = Column(UUID(as_uuid=True), primary_key=True)
+    hour: Mapped[datetime] = Column(DateTime(timezone=True), primary_key=True)
+    sessions: Mapped[int] = Column(BigInteger, default=0, nullable=False)
+    browser_seconds: Mapped[float] = Column(Float, default=0, nullable=False)
+    bytes: Mapped[int] = Column(BigInteger, default=0, nullable=False)
@@ -0,0 +1,223 @@
+"""
+Daily range partitions for `browser_sessions`.
+
+    browser_sessions              PARTITION BY RANGE (created_at)
+      browser_sessions_p20261019  [2026-10-19, 2026-10-20)  UTC
+      …
+      browser_sessions_default    anything else (maintenance fell behind)
+
+* `ensure_partitions` keeps SESSION_LOG_PREMAKE_DAYS future partitions ready
+  (run at start-up and by the leader's maintenance loop).  If it ever falls
+  behind, inserts land in the DEFAULT partition instead of failing, and the
+  next run moves them into their day's partition.
+* `archive_expired` exports partitions older than SESSION_LOG_RETENTION_DAYS
+  to MinIO as gzipped JSON lines, then detaches and drops them.  Nothing is
+  dropped unless the upload succeeded.
+* `migrate_legacy_table` / `adopt_legacy_rows` convert a pre-partitioning
+  table in place during `create_schema()`.
+
+Live sessions never outlast SESSION_TIMEOUT, so queries about them add a
+`created_at` lower bound (`hot_since`, `created_lower_bound`) and Postgres
+prunes everything but the newest partition or two.
+"""
+# gateway/partitions.py
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import tempfile
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from urllib.parse import urlparse
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from ulid import ULID
+
+from config import get_settings, Settings
+
+settings: Settings = get_settings()
+
+TABLE = "browser_sessions"
+_LEGACY = f"{TABLE}_legacy"
+_PREFIX = f"{TABLE}_p"
+DEFAULT_PARTITION = f"{TABLE}_default"
+# a session is "hot" for its absolute lifetime plus slack for outages
+HOT_SLACK = timedelta(days=1)
+
+
+def partition_name(day: date) -> str:
+    return f"{_PREFIX}{day:%Y%m%d}"
+
+
+def _day_start(day: date) -> str:
+    return datetime.combine(day, time(), tzinfo=timezone.utc).isoformat()
+
+
+def hot_since() -> datetime:
+    """Lower `created_at` bound that still covers every live session."""
+    return (datetime.now(tz=timezone.utc)
+            - timedelta(seconds=settings.session_timeout) - HOT_SLACK)
+
+
+def created_lower_bound(session_id: str) -> datetime | None:
+    """
+    Session ids are ULIDs generated just before the row is inserted, so the
+    id's timestamp bounds `created_at` from below – enough to prune an
+    UPDATE down to the partition(s) from that day on.
+    """
+    try:
+        return ULID.from_uuid(uuid.UUID(session_id)).datetime
+    except ValueError:
+        return None
+
+
+# ───────────────────────── partition DDL ───────────────────────── #
+
+async def ensure_partitions(
+    conn: AsyncConnection, first: date | None = None, ahead: int | None = None,
+) -> None:
+    """Create the daily partitions from `first` (default today) to today + ahead."""
+    await conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"
+    ))
+    today = datetime.now(tz=timezone.utc).date()
+    day = first or today
+    last = today + timedelta(days=settings.session_log_premake_days if ahead is None else ahead)
+    while day <= last:
+        if await conn.scalar(text("SELECT to_regclass(:t)"), {"t": partition_name(day)}) is None:
+            await _create_partition(conn, day)
+        day += timedelta(days=1)
+
+
+async def _create_partition(conn: AsyncConnection, day: date) -> None:
+    name = partition_name(day)
+    bounds = f"FROM ('{_day_start(day)}') TO ('{_day_start(day + timedelta(days=1))}')"
+    in_range = {"lo": _day_start(day), "hi": _day_start(day + timedelta(days=1))}
+    stray = await conn.scalar(text(
+        f"SELECT count(*) FROM {DEFAULT_PARTITION} "
+        f"WHERE created_at >= CAST(:lo AS timestamptz) AND created_at < CAST(:hi AS timestamptz)"
+    ), in_range)
+    if not stray:
+        await conn.execute(text(f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES {bounds}"))
+        return
+    # Postgres refuses a new partition whose range has rows in DEFAULT:
+    # build it standalone, move the rows over, then attach it
+    print(f"[partitions] moving {stray} row(s) from {DEFAULT_PARTITION} into {name}")
+    await conn.execute(text(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING ALL)"))
+    await conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        f"WHERE created_at >= CAST(:lo AS timestamptz) AND created_at < CAST(:hi AS timestamptz) "
+        f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+    ), in_range)
+    await conn.execute(text(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+
+
+async def list_partitions(conn: AsyncConnection) -> list[tuple[str, date]]:
+    """(partition name, day) for every daily partition, oldest first."""
+    rows = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:t) ORDER BY c.relname"
+    ), {"t": TABLE})
+    out = []
+    for (name,) in rows:
+        try:
+            out.append((name, datetime.strptime(name[len(_PREFIX):], "%Y%m%d").date()))
+        except ValueError:
+            continue                         # DEFAULT, or not one of ours
+    return out
+
+
+# ───────────────────────── one-off migration ───────────────────────── #
+
+async def migrate_legacy_table(conn: AsyncConnection) -> bool:
+    """
+    If `browser_sessions` is still a plain table, move it (and the names of
+    its index / primary key) out of the way so `create_all` can build the
+    partitioned one.  Returns True if there is legacy data to adopt.
+    """
+    kind = await conn.scalar(text(
+        "SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)"
+    ), {"t": TABLE})
+    if kind != "r":                          # missing, or already partitioned ('p')
+        return False
+    await conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {_LEGACY}"))
+    await conn.execute(text(
+        f"ALTER TABLE {_LEGACY} RENAME CONSTRAINT {TABLE}_pkey TO {_LEGACY}_pkey"
+    ))
+    await conn.execute(text(
+        f"ALTER INDEX IF EXISTS ix_{TABLE}_tenant_id RENAME TO ix_{_LEGACY}_tenant_id"
+    ))
+    return True
+
+
+async def adopt_legacy_rows(conn: AsyncConnection) -> None:
+    """Copy the renamed table into the partitions, then drop it (same transaction)."""
+    oldest = await conn.scalar(text(f"SELECT min(created_at) FROM {_LEGACY}"))
+    if oldest is not None:
+        await ensure_partitions(conn, first=oldest.astimezone(timezone.utc).date())
+    cols = "session_id, tenant_id, worker_id, created_at, last_active_at, ended_at, status"
+    await conn.execute(text(f"INSERT INTO {TABLE} ({cols}) SELECT {cols} FROM {_LEGACY}"))
+    await conn.execute(text(f"DROP TABLE {_LEGACY}"))
+
+
+# ───────────────────────── retention / archival ───────────────────────── #
+
+def _minio():
+    from minio import Minio                  # only the archiver needs it
+
+    url = urlparse(settings.minio_endpoint)
+    return Minio(
+        url.netloc or url.path,
+        access_key=settings.minio_access_key,
+        secret_key=settings.minio_secret_key,
+        secure=url.scheme == "https",
+    )
+
+
+def _upload(path: str, object_name: str) -> None:
+    client = _minio()
+    if not client.bucket_exists(settings.minio_bucket):
+        client.make_bucket(settings.minio_bucket)
+    client.fput_object(settings.minio_bucket, object_name, path,
+                       content_type="application/gzip")
+
+
+async def _export(conn: AsyncConnection, name: str, path: str) -> int:
+    """Stream one partition into a gzipped JSON-lines file; returns row count."""
+    rows = 0
+    with gzip.open(path, "wt", encoding="utf-8") as out:
+        result = await conn.stream(text(f"SELECT * FROM {name} ORDER BY created_at"))
+        async for chunk in result.mappings().partitions(1000):
+            lines = "".join(json.dumps(dict(r), default=str) + "\n" for r in chunk)
+            await asyncio.to_thread(out.write, lines)
+            rows += len(chunk)
+    return rows
+
+
+async def archive_expired(engine) -> list[str]:
+    """Archive + drop every partition wholly older than the retention window."""
+    if not settings.minio_endpoint:
+        return []                            # never drop what we cannot archive
+    cutoff = (datetime.now(tz=timezone.utc)
+              - timedelta(days=settings.session_log_retention_days)).date()
+
+    async with engine.connect() as conn:
+        expired = [(n, d) for n, d in await list_partitions(conn) if d + timedelta(days=1) <= cutoff]
+
+    archived = []
+    for name, day in expired:
+        object_name = f"{settings.session_log_archive_prefix}{TABLE}/{day:%Y/%m/%d}.jsonl.gz"
+        with tempfile.NamedTemporaryFile(suffix=".jsonl.gz") as tmp:
+            async with engine.connect() as conn:
+                rows = await _export(conn, name, tmp.name)
+            await asyncio.to_thread(_upload, tmp.name, object_name)
+
+        async with engine.begin() as conn:
+            await conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+            await conn.execute(text(f"DROP TABLE {name}"))
+        print(f"[partitions] archived {name} ({rows} rows) → {object_name}")
+        archived.append(name)
+    return archived
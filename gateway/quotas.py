@@ -0,0 +1,199 @@
+"""
+Per-tenant quotas, enforced atomically in Redis.
+
+* max concurrent sessions – checked inside the worker-pick script
+  (session_manager), against the set tenant_sessions:{tenant}
+* session creation rate    – token bucket  bucket:create:{tenant}
+* CDP message rate         – token bucket  bucket:cdp:{tenant}; each relay
+  leases tokens in small chunks so Redis is not hit per frame
+
+Limits come from the `tenant_limits` table (NULL column → env default) and
+are cached in-process for TENANT_LIMITS_CACHE_TTL seconds.  A limit of 0
+means unlimited.
+"""
+# gateway/quotas.py
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+import uuid
+from dataclasses import dataclass, fields
+
+from config import get_settings, Settings
+from db import get_session
+from models import TenantLimits
+from session_manager import redis
+
+settings: Settings = get_settings()
+
+# KEYS: bucket hash   ARGV: rate (tokens/s), burst, cost
+# Returns {allowed 0/1, tokens left, seconds until `cost` is available}
+# (as strings – Lua numbers would be truncated to integers).  Uses the
+# Redis clock so replicas with skewed clocks share one bucket correctly.
+_TOKEN_BUCKET_LUA = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1e6
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(b[1]) or burst
+local ts = tonumber(b[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+local wait = 0
+if allowed == 0 then wait = (cost - tokens) / rate end
+return {allowed, tostring(tokens), tostring(wait)}
+"""
+
+# KEYS: bucket hash   ARGV: tokens, burst
+# Hand back tokens for work that never happened.  A missing bucket has
+# expired, i.e. it is full already; `ts` is kept so refill stays exact.
+_REFUND_LUA = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+if not tokens then return 0 end
+redis.call('HSET', KEYS[1], 'tokens', math.min(tonumber(ARGV[2]), tokens + tonumber(ARGV[1])))
+return 1
+"""
+
+_token_bucket_script = redis.register_script(_TOKEN_BUCKET_LUA)
+_refund_script = redis.register_script(_REFUND_LUA)
+
+
+@dataclass(frozen=True)
+class Limits:
+    max_sessions: int
+    create_rate: float          # sessions / s
+    create_burst: int
+    cdp_rate: float             # client → browser messages / s
+    cdp_burst: int
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, scope: str, limit: float, retry_after: float, remaining: float = 0):
+        super().__init__(f"tenant {scope} limit reached")
+        self.scope = scope
+        self.limit = limit
+        self.retry_after = retry_after
+        self.remaining = remaining
+
+    def headers(self) -> dict[str, str]:
+        retry = max(1, math.ceil(self.retry_after))
+        return {
+            "Retry-After":           str(retry),
+            "X-RateLimit-Scope":     self.scope,
+            "X-RateLimit-Limit":     f"{self.limit:g}",
+            "X-RateLimit-Remaining": str(int(self.remaining)),
+            "X-RateLimit-Reset":     str(int(time.time()) + retry),
+        }
+
+
+# ───────────────────────── limits lookup ───────────────────────── #
+
+_cache: dict[uuid.UUID, tuple[float, Limits]] = {}
+
+
+def _defaults() -> Limits:
+    return Limits(
+        max_sessions=settings.tenant_max_sessions,
+        create_rate=settings.tenant_create_rate,
+        create_burst=settings.tenant_create_burst,
+        cdp_rate=settings.tenant_cdp_rate,
+        cdp_burst=settings.tenant_cdp_burst,
+    )
+
+
+async def get_limits(tenant_id: uuid.UUID) -> Limits:
+    hit = _cache.get(tenant_id)
+    if hit and hit[0] > time.monotonic():
+        return hit[1]
+
+    limits = _defaults()
+    async with get_session() as db:
+        row = await db.get(TenantLimits, tenant_id)
+    if row is not None:
+        limits = Limits(**{
+            f.name: getattr(row, f.name) if getattr(row, f.name) is not None
+            else getattr(limits, f.name)
+            for f in fields(Limits)
+        })
+
+    _cache[tenant_id] = (time.monotonic() + settings.tenant_limits_cache_ttl, limits)
+    return limits
+
+
+# ───────────────────────── enforcement ───────────────────────── #
+
+async def _take(key: str, rate: float, burst: int, cost: int) -> tuple[bool, float, float]:
+    allowed, tokens, wait = await _token_bucket_script(
+        keys=[key], args=[rate, burst, cost],
+    )
+    return bool(allowed), float(tokens), float(wait)
+
+
+async def check_create(tenant_id: uuid.UUID, limits: Limits, count: int = 1) -> None:
+    """Spend `count` creation tokens or raise QuotaExceeded."""
+    if limits.create_rate <= 0:
+        return
+    if count > limits.create_burst:
+        # could never succeed – tell the client how long a full bucket takes
+        raise QuotaExceeded("create_rate", limits.create_rate,
+                            limits.create_burst / limits.create_rate)
+    ok, tokens, wait = await _take(
+        f"bucket:create:{tenant_id}", limits.create_rate, limits.create_burst, count,
+    )
+    if not ok:
+        raise QuotaExceeded("create_rate", limits.create_rate, wait, tokens)
+
+
+async def refund_create(tenant_id: uuid.UUID, limits: Limits, count: int = 1) -> None:
+    """Return the tokens of `count` creates that did not produce a session."""
+    if limits.create_rate <= 0 or count <= 0:
+        return
+    await _refund_script(keys=[f"bucket:create:{tenant_id}"], args=[count, limits.create_burst])
+
+
+async def session_limit_exceeded(tenant_id: uuid.UUID, limits: Limits) -> QuotaExceeded:
+    """
+    Build the 429 for a full concurrent-session quota.  Retry-After is the
+    earliest moment one of the tenant's sessions can hit its idle timeout.
+    """
+    sids = list(await redis.smembers(f"{settings.redis_tenant_sessions_prefix}{tenant_id}"))
+    retry = settings.idle_timeout
+    if sids:
+        last = [s for s in await redis.zmscore(settings.redis_last_active_key, sids) if s]
+        if last:
+            retry = min(last) + settings.idle_timeout - time.time()
+    return QuotaExceeded("sessions", limits.max_sessions, retry)
+
+
+class CdpThrottle:
+    """
+    Per-connection view of the tenant's CDP bucket: leases up to `chunk`
+    tokens per Redis call and waits (instead of dropping frames) when the
+    bucket is empty.
+    """
+
+    def __init__(self, tenant_id: str, limits: Limits, chunk: int = 50) -> None:
+        self._key = f"bucket:cdp:{tenant_id}"
+        self._limits = limits
+        self._chunk = max(1, min(chunk, limits.cdp_burst))
+        self._local = 0
+
+    async def acquire(self) -> None:
+        if self._limits.cdp_rate <= 0:
+            return
+        while self._local == 0:
+            ok, _, wait = await _take(
+                self._key, self._limits.cdp_rate, self._limits.cdp_burst, self._chunk,
+            )
+            if ok:
+                self._local = self._chunk
+            else:
+                await asyncio.sleep(wait)
+        self._local -= 1
@@ -1,6 +1,7 @@
 # gateway/schema.py
 import uuid
 from datetime import datetime
+from typing import Literal
 from pydantic import BaseModel, Field, ConfigDict   # << add ConfigDict
 
 class SessionInfo(BaseModel):
@@ -19,3 +20,20 @@ class SessionInfo(BaseModel):
 
 class SessionList(BaseModel):
     sessions: list[SessionInfo]
+
+
+# ---------- launch profiles (forwarded verbatim to the worker) ---------- #
+
+class Viewport(BaseModel):
+    width:  int = Field(1280, ge=200, le=7680)
+    height: int = Field(720,  ge=200, le=4320)
+
+class LaunchProfile(BaseModel):
+    """Lighter, denser sessions: block what scrapers never look at."""
+    block_resource_types: list[Literal["image", "font", "media", "stylesheet"]] = []
+    block_url_patterns:   list[str] = []        # CDP wildcards, e.g. "*://*.doubleclick.net/*"
+    viewport:             Viewport | None = None
+    low_memory:           bool = False          # fewer renderers, small V8 heap, no GPU
+    template:             str | None = Field(   # warm user-data-dir on the worker
+        None, pattern=r"^[A-Za-z0-9_-]{1,64}$",
+    )
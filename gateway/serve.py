@@ -0,0 +1,65 @@
+"""
+Production entrypoint: N uvicorn worker processes on uvloop + httptools.
+
+    GATEWAY_PROCESSES=0 python serve.py      # 0 / unset → one per CPU
+
+Every process is shared-nothing: its own event loop, Redis pool and
+SQLAlchemy engine (sized from DB_MAX_CONNECTIONS / GATEWAY_PROCESSES).
+Cluster-wide state lives in Redis, and the singleton jobs (sweeper,
+reconciler, partition and usage maintenance) already run only on the holder of
+the Redis leader lease, whichever process or replica that is.  The schema
+is created here, once, before the workers start (skipped when
+GATEWAY_SCHEMA_READY is already set).
+
+This is the only supported way to start the gateway: the tuned CDP
+compression (ws_compression.py) is a uvicorn protocol class and cannot be
+picked up from `app`, so `uvicorn app:app` runs with stock deflate and the
+app logs a warning at start-up.
+"""
+# gateway/serve.py
+import asyncio
+import os
+
+# resolve the process count *before* config is imported, so the children
+# (which inherit the environment) size their pools for the same number
+_n = int(os.getenv("GATEWAY_PROCESSES", "0") or 0)
+os.environ["GATEWAY_PROCESSES"] = str(_n if _n > 0 else os.cpu_count() or 1)
+
+import uvicorn                                              # noqa: E402
+
+from config import get_settings                             # noqa: E402
+from ws_compression import CompressedWebSocketProtocol      # noqa: E402
+
+
+async def _prepare() -> None:
+    from db import create_schema, engine
+    import models  # noqa: F401  – register tables on Base
+
+    await create_schema()
+    await engine.dispose()                  # never hand pooled sockets to children
+
+
+def main() -> None:
+    settings = get_settings()
+    if not os.getenv("GATEWAY_SCHEMA_READY"):     # e.g. a migration job already ran
+        asyncio.run(_prepare())
+        os.environ["GATEWAY_SCHEMA_READY"] = "1"
+
+    print(f"[serve] {settings.gateway_processes} process(es), "
+          f"≤{settings.db_max_connections} DB connections in total")
+    os.environ["GATEWAY_ENTRYPOINT"] = "serve.py"   # app.py checks it; children inherit
+    uvicorn.run(
+        "app:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=settings.gateway_processes,
+        loop="uvloop",
+        http="httptools",
+        ws=CompressedWebSocketProtocol,       # tuned permessage-deflate (WS_DEFLATE_*)
+        lifespan="on",
+        log_level=os.getenv("LOG_LEVEL", "info"),
+    )
+
+
+if __name__ == "__main__":
+    main()
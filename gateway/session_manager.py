@@ -6,118 +6,537 @@ Only the create / close logic changed – timeout sweeper is untouched.
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import json
 import os
 from datetime import datetime, timezone
 from typing import Sequence
 import uuid
 
 import redis.asyncio as aioredis
-from aiohttp import ClientSession
-from sqlalchemy import text
+from aiohttp import ClientSession, ClientTimeout
+from sqlalchemy import insert, text
 from ulid import ULID
 
 from config import get_settings, Settings
-from db import get_session
+from db import engine, get_session
+from leader import LeaderLease
+import metrics
 from models import BrowserSession
+import partitions
+import usage
 
 settings: Settings = get_settings()
-redis = aioredis.from_url(settings.redis_url, encoding="utf-8", decode_responses=True)
+# bounded per process: callers wait for a free connection instead of erroring
+redis = aioredis.Redis(connection_pool=aioredis.BlockingConnectionPool.from_url(
+    settings.redis_url, encoding="utf-8", decode_responses=True,
+    max_connections=settings.redis_max_connections, timeout=10,
+))
+
+class NoCapacityError(RuntimeError):
+    """Every schedulable worker is full."""
+
+
+class TenantLimitError(RuntimeError):
+    """The tenant already holds its maximum number of concurrent sessions."""
+
+
+QUOTA_DENIED = "!quota"          # pick result: tenant at its session limit
+TENANT_LIMIT_MSG = "Tenant session limit reached"
+
+
+# cluster-wide singleton work (sweeper, reconciler) runs only on the holder
+maintenance_lease = LeaderLease(redis, "maintenance", settings.leader_lease_ttl)
+
+# teardown must not hang on a worker that vanished from the network
+_WORKER_RPC_TIMEOUT = ClientTimeout(total=10)
+# nor a create on one that stalls mid-launch (the reservation is held)
+_WORKER_LAUNCH_TIMEOUT = ClientTimeout(total=settings.worker_launch_timeout)
 
 # ───────────────────── Lua helper for worker pick ───────────────────── #
 
+# KEYS: workers_load, session_map, workers_state, workers_capacity,
+#       tenant_sessions:{tenant}, session:{sid1}, session:{sid2}, …
+# ARGV: max, now, worker_sessions prefix, tenant, tenant max (0 = ∞),
+#       sid1, sid2, …            (KEYS[i] is the state hash of ARGV[i])
+# One scheduling pass: each sid goes to the least-loaded *schedulable*
+# worker (no entry in workers_state, e.g. memory pressure, and below its
+# published capacity – `max` for workers without one) and its slot is
+# *reserved* right away (session_map + per-worker set +
+# session:{id}.reservedAt), so the load score always equals the number of
+# sessions placed on a worker – pending creates included.  The tenant's
+# concurrent-session quota is checked in the same pass.  Returns one
+# worker per sid, '' for sids that found no capacity, '!quota' for sids
+# over the tenant's limit.  Workers are scanned a page at a time in load
+# order and the scan stops at the first that fits.  worker_sessions:{w} is
+# built in the script (the worker is only known here), so – like the
+# release script – this needs a single Redis instance, not Cluster;
+# pick_workers passes at most _PICK_CHUNK sids per call to bound its run.
 _PICK_WORKER_LUA = """
 local max = tonumber(ARGV[1])
-local c = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
-if not c[1] then return nil end
-local w, load = c[1], tonumber(c[2])
-if max and load >= max then return nil end
-redis.call('ZINCRBY', KEYS[1], 1, w)
-return w
+local tenant_max = tonumber(ARGV[5])
+local placed = {}
+for i = 6, #ARGV do
+    local sid = ARGV[i]
+    local w = nil
+    if tenant_max > 0 and redis.call('SCARD', KEYS[5]) >= tenant_max then
+        w = '!quota'
+    else
+        local off = 0
+        repeat
+            local c = redis.call('ZRANGE', KEYS[1], off, off + 15, 'WITHSCORES')
+            for j = 1, #c, 2 do
+                local cap = tonumber(redis.call('HGET', KEYS[4], c[j])) or max
+                if (not cap or tonumber(c[j + 1]) < cap)
+                   and redis.call('HEXISTS', KEYS[3], c[j]) == 0 then
+                    w = c[j]
+                    break
+                end
+            end
+            off = off + 16
+        until w or #c < 32
+    end
+    if not w then
+        placed[#placed + 1] = ''
+    elseif w == '!quota' then
+        placed[#placed + 1] = w
+    else
+        redis.call('ZINCRBY', KEYS[1], 1, w)
+        redis.call('HSET', KEYS[2], sid, w)
+        redis.call('SADD', ARGV[3] .. w, sid)
+        redis.call('SADD', KEYS[5], sid)
+        redis.call('HSET', KEYS[i], 'reservedAt', ARGV[2], 'tenant', ARGV[4])
+        placed[#placed + 1] = w
+    end
+end
+return placed
 """
 
-async def pick_worker(max_contexts: int | None = None) -> str | None:
-    return await redis.eval(
-        _PICK_WORKER_LUA, 1,
-        settings.redis_workers_load_key,
-        str(max_contexts or ""),
-    )
+# ─────────────── Lua helpers for session state transitions ─────────────── #
+# Every transition that touches more than one key runs server-side so two
+# concurrent callers (client disconnect vs. sweeper, …) can never interleave.
+
+# KEYS: session_map, session:{id}, last_active
+# ARGV: sid, worker, field1, value1, …
+# Returns 1 → registered, 0 → the reservation was released meanwhile
+# (DELETE during create, reaped as stale, …) – nothing written.
+# registeredAt is Redis TIME with µs, the clock workers stamp their
+# heartbeats with, so the reconciler can order the two exactly.
+_REGISTER_SESSION_LUA = """
+if redis.call('HGET', KEYS[1], ARGV[1]) ~= ARGV[2] then return 0 end
+local t = redis.call('TIME')
+local now = t[1] .. '.' .. string.format('%06d', tonumber(t[2]))
+redis.call('HSET', KEYS[2], 'registeredAt', now, unpack(ARGV, 3))
+redis.call('ZADD', KEYS[3], now, ARGV[1])
+return 1
+"""
+
+# KEYS: session_map, session:{id}, last_active, detached, workers_load
+# ARGV: sid, worker_sessions prefix, tenant_sessions prefix, field1, field2, …
+# Works for pending reservations and registered sessions alike.  Returns
+# {worker, value of field1 ('' if unset), …} – only to the *first* caller;
+# everybody else gets nil, so the load is decremented exactly once.  A
+# worker that already deregistered is not re-added with a negative score.
+_RELEASE_SESSION_LUA = """
+local w = redis.call('HGET', KEYS[1], ARGV[1])
+if not w then return nil end
+local out = {w}
+for i = 4, #ARGV do
+    out[#out + 1] = redis.call('HGET', KEYS[2], ARGV[i]) or ''
+end
+local tenant = redis.call('HGET', KEYS[2], 'tenant')
+if tenant then redis.call('SREM', ARGV[3] .. tenant, ARGV[1]) end
+redis.call('HDEL', KEYS[1], ARGV[1])
+redis.call('DEL', KEYS[2])
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('ZREM', KEYS[4], ARGV[1])
+redis.call('SREM', ARGV[2] .. w, ARGV[1])
+if redis.call('ZSCORE', KEYS[5], w) then
+    redis.call('ZINCRBY', KEYS[5], -1, w)
+end
+return out
+"""
+
+# KEYS: session:{id}, detached
+# ARGV: sid
+# Returns the new attach generation, or nil if the session is gone.
+_ATTACH_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return nil end
+redis.call('ZREM', KEYS[2], ARGV[1])
+return redis.call('HINCRBY', KEYS[1], 'attachGen', 1)
+"""
+
+# KEYS: session:{id}, detached
+# ARGV: sid, gen, now
+# Returns 1 → parked in the grace zset, 0 → a newer client attached (or the
+# session is already gone), -1 → not a keep-alive session, caller closes it.
+_DETACH_LUA = """
+if redis.call('HGET', KEYS[1], 'keepAlive') ~= '1' then return -1 end
+if redis.call('HGET', KEYS[1], 'attachGen') ~= ARGV[2] then return 0 end
+local grace = tonumber(redis.call('HGET', KEYS[1], 'grace') or '0')
+redis.call('ZADD', KEYS[2], tonumber(ARGV[3]) + grace, ARGV[1])
+return 1
+"""
+
+# KEYS: workers_load, worker_sessions:{w}
+# ARGV: worker
+# Reset a worker's load score to its real session count (only if registered).
+_SYNC_LOAD_LUA = """
+return redis.call('ZADD', KEYS[1], 'XX', 'CH',
+                  redis.call('SCARD', KEYS[2]), ARGV[1])
+"""
+
+# sids per pick script call: Redis runs a script to completion, blocking all
+# other clients, so a big batch is placed in several short passes
+_PICK_CHUNK = 50
+
+# EVALSHA after the first call – the script body is not resent every time
+_pick_worker_script     = redis.register_script(_PICK_WORKER_LUA)
+_register_session_script = redis.register_script(_REGISTER_SESSION_LUA)
+_release_session_script = redis.register_script(_RELEASE_SESSION_LUA)
+_attach_script          = redis.register_script(_ATTACH_LUA)
+_detach_script          = redis.register_script(_DETACH_LUA)
+_sync_load_script       = redis.register_script(_SYNC_LOAD_LUA)
+
+
+async def pick_workers(
+    session_ids: Sequence[str],
+    tenant_id: uuid.UUID,
+    tenant_max: int = 0,
+    max_contexts: int | None = None,
+) -> list[str | None]:
+    """
+    Reserve one slot per session id.  Each entry is the worker host, None
+    where the cluster is full, or QUOTA_DENIED past the tenant's limit.
+    """
+    now = int(datetime.now(tz=timezone.utc).timestamp())
+    placed: list[str] = []
+    for i in range(0, len(session_ids), _PICK_CHUNK):
+        chunk = session_ids[i:i + _PICK_CHUNK]
+        placed += await _pick_worker_script(
+            keys=[
+                settings.redis_workers_load_key,
+                settings.redis_session_map_key,
+                settings.redis_workers_state_key,
+                settings.redis_workers_capacity_key,
+                f"{settings.redis_tenant_sessions_prefix}{tenant_id}",
+                *(f"session:{sid}" for sid in chunk),
+            ],
+            args=[str(max_contexts or ""), now, settings.redis_worker_sessions_prefix,
+                  str(tenant_id), tenant_max, *chunk],
+        )
+    return [w or None for w in placed]
+
+async def pick_worker(
+    session_id: str, tenant_id: uuid.UUID, tenant_max: int = 0,
+    max_contexts: int | None = None,
+) -> str | None:
+    """Reserve a slot for `session_id` on the least-loaded worker."""
+    return (await pick_workers([session_id], tenant_id, tenant_max, max_contexts))[0]
+
+def _register_call(session_id: str, worker_host: str, fields: dict) -> dict:
+    flat = [x for kv in fields.items() for x in kv]
+    return {
+        "keys": [
+            settings.redis_session_map_key,
+            f"session:{session_id}",
+            settings.redis_last_active_key,
+        ],
+        "args": [session_id, worker_host, *flat],
+    }
 
-async def decrement_worker_load(w: str) -> None:
-    await redis.zincrby(settings.redis_workers_load_key, -1, w)
+async def register_session(session_id: str, worker_host: str, fields: dict) -> bool:
+    """Publish a freshly launched session (map + state hash + activity) at once."""
+    return bool(await _register_session_script(
+        **_register_call(session_id, worker_host, fields)
+    ))
+
+# session:{id} fields handed back by a release, for metrics / metering
+_RELEASE_FIELDS = ("reservedAt", "registeredAt", "tenant")
+
+async def release_session(session_id: str) -> dict[str, str | None] | None:
+    """
+    Drop every Redis trace of a session and give its slot back.
+    Idempotent: the one caller that won the race gets
+    {"worker": host, <_RELEASE_FIELDS>…}, everybody else None.
+    """
+    released = await _release_session_script(
+        keys=[
+            settings.redis_session_map_key,
+            f"session:{session_id}",
+            settings.redis_last_active_key,
+            settings.redis_detached_key,
+            settings.redis_workers_load_key,
+        ],
+        args=[session_id, settings.redis_worker_sessions_prefix,
+              settings.redis_tenant_sessions_prefix, *_RELEASE_FIELDS],
+    )
+    if not released:
+        return None
+    return {k: v or None for k, v in zip(("worker", *_RELEASE_FIELDS), released)}
 
 # ────────────────────────── Public API ────────────────────────── #
 
-async def create_session(tenant_id: uuid.UUID) -> dict[str, str]:
+async def create_session(
+    tenant_id: uuid.UUID,
+    keep_alive: bool = False,
+    grace_period: int | None = None,
+    profile: dict | None = None,
+    tenant_max: int = 0,
+) -> dict[str, str]:
     # ULID → UUID keeps ordering benefits while matching DB column type
     public_host = os.getenv("PUBLIC_GATEWAY_HOST", "localhost")
     session_id = str(ULID().to_uuid())
-    worker_host = await pick_worker()
+    worker_host = await pick_worker(session_id, tenant_id, tenant_max)
+    if worker_host == QUOTA_DENIED:
+        raise TenantLimitError(TENANT_LIMIT_MSG)
     if not worker_host:
-        raise RuntimeError("No available workers")
+        await metrics.record(redis, "rejected")
+        raise NoCapacityError("No available workers")
 
-    # 1️⃣ ask worker to spin up a *new browser process*
-    async with ClientSession() as http:
-        resp = await http.post(
-            f"http://{worker_host}:5000/browser",
-            json={"session_id": session_id},
-        )
-        if resp.status != 200:
-            await decrement_worker_load(worker_host)
-            raise RuntimeError(f"{worker_host}: {resp.status} {await resp.text()}")
-        data = await resp.json()
+    try:
+        # 1️⃣ ask worker to spin up a *new browser process*
+        async with ClientSession(timeout=_WORKER_LAUNCH_TIMEOUT) as http:
+            resp = await http.post(
+                f"http://{worker_host}:5000/browser",
+                json={"session_id": session_id, "keep_alive": keep_alive, "profile": profile},
+            )
+            if resp.status != 200:
+                raise RuntimeError(f"{worker_host}: {resp.status} {await resp.text()}")
+            data = await resp.json()
         browser_id: str = data["browserId"]
         port: int      = data["port"]
 
-    # 2️⃣ persist row
-    async with get_session() as db:
-        db.add(BrowserSession(
-            tenant_id=tenant_id,
-            session_id=session_id,
-            worker_id=worker_host,
-        ))
-        await db.commit()
+        # 2️⃣ persist row
+        async with get_session() as db:
+            db.add(BrowserSession(
+                tenant_id=tenant_id,
+                session_id=session_id,
+                worker_id=worker_host,
+            ))
+            await db.commit()
 
-    # 3️⃣ cache in Redis
-    now = int(datetime.now(tz=timezone.utc).timestamp())
-    pipe = redis.pipeline()
-    pipe.hset(settings.redis_session_map_key, session_id, worker_host)
-    pipe.hset(f"session:{session_id}", mapping={
-        "browserId": browser_id,
-        "port":     port,
-    })
-    pipe.zadd(settings.redis_last_active_key, {session_id: now})
-    await pipe.execute()
+        # 3️⃣ cache in Redis – one round trip
+        if not await register_session(
+            session_id, worker_host,
+            _session_fields(browser_id, port, keep_alive, grace_period),
+        ):
+            raise RuntimeError(f"session {session_id} was released during create")
+    except Exception:
+        # don't leak the browser (a timed-out launch may still have made
+        # one), the reserved slot or an 'active' row
+        await release_session(session_id)
+        with contextlib.suppress(Exception):     # never mask the original error
+            async with ClientSession(timeout=_WORKER_RPC_TIMEOUT) as http:
+                await http.delete(f"http://{worker_host}:5000/browser/{session_id}")
+        await _mark_failed([session_id])
+        raise
+    await metrics.record(redis, "created")
 
     return {
         "session_id": session_id,
         "connect_url": f"ws://{public_host}:8000/session/{session_id}",
     }
 
+async def create_sessions(
+    tenant_id: uuid.UUID,
+    count: int,
+    keep_alive: bool = False,
+    grace_period: int | None = None,
+    profile: dict | None = None,
+    tenant_max: int = 0,
+) -> list[dict[str, str]]:
+    """
+    Batch flavour of `create_session`: scheduling passes of up to 50 sids,
+    one launch RPC per worker, one multi-row INSERT and one Redis pipeline.
+    Returns one dict per requested session – either `connect_url` or `error`.
+    """
+    public_host = os.getenv("PUBLIC_GATEWAY_HOST", "localhost")
+    session_ids = [str(ULID().to_uuid()) for _ in range(count)]
+    workers = await pick_workers(session_ids, tenant_id, tenant_max)
+
+    errors: dict[str, str] = {}
+    by_worker: dict[str, list[str]] = {}
+    for sid, w in zip(session_ids, workers):
+        if w == QUOTA_DENIED:
+            errors[sid] = TENANT_LIMIT_MSG
+        elif w:
+            by_worker.setdefault(w, []).append(sid)
+        else:
+            errors[sid] = "No available workers"
+    no_capacity = sum(1 for e in errors.values() if e != TENANT_LIMIT_MSG)
+    if no_capacity:
+        await metrics.record(redis, "rejected", no_capacity)
+
+    # 1️⃣ each worker launches its share in one call
+    async def launch(http: ClientSession, w: str, sids: list[str]) -> dict:
+        try:
+            resp = await http.post(
+                f"http://{w}:5000/browsers",
+                json={"sessions": [
+                    {"session_id": sid, "keep_alive": keep_alive, "profile": profile}
+                    for sid in sids
+                ]},
+            )
+            if resp.status != 200:
+                raise RuntimeError(f"{w}: {resp.status} {await resp.text()}")
+            return (await resp.json())["results"]
+        except Exception as exc:
+            # str() of a timeout is empty
+            return {sid: {"error": str(exc) or type(exc).__name__} for sid in sids}
+
+    launched: dict[str, tuple[str, dict]] = {}     # sid → (worker, {browserId, port})
+    # a stalled worker fails its own share, not the whole batch
+    async with ClientSession(timeout=_WORKER_LAUNCH_TIMEOUT) as http:
+        results = await asyncio.gather(*(
+            launch(http, w, sids) for w, sids in by_worker.items()
+        ))
+    for w, res in zip(by_worker, results):
+        for sid in by_worker[w]:
+            item = res.get(sid) or {"error": "missing from worker reply"}
+            if "error" in item:
+                errors[sid] = f"{w}: {item['error']}"
+            else:
+                launched[sid] = (w, item)
+
+    if launched:
+        try:
+            # 2️⃣ persist all rows in a single multi-row INSERT
+            async with get_session() as db:
+                await db.execute(insert(BrowserSession).values([
+                    {"session_id": sid, "tenant_id": tenant_id, "worker_id": w}
+                    for sid, (w, _) in launched.items()
+                ]))
+                await db.commit()
+
+            # 3️⃣ register everything in one Redis round trip
+            pipe = redis.pipeline(transaction=False)
+            for sid, (w, item) in launched.items():
+                await _register_session_script(
+                    **_register_call(sid, w, _session_fields(
+                        item["browserId"], item["port"], keep_alive, grace_period,
+                    )),
+                    client=pipe,
+                )
+            for sid, ok in zip(list(launched), await pipe.execute()):
+                if not ok:
+                    errors[sid] = "released during create"
+        except Exception as exc:
+            for sid in launched:
+                errors.setdefault(sid, str(exc))
+
+    # 4️⃣ give back every reservation that did not make it
+    for sid in errors:
+        await release_session(sid)
+    if len(errors) < count:
+        await metrics.record(redis, "created", count - len(errors))
+    doomed = [(launched[sid][0], sid) for sid in errors if sid in launched]
+    if doomed:
+        async with ClientSession(timeout=_WORKER_RPC_TIMEOUT) as http:
+            for w, sid in doomed:
+                with contextlib.suppress(Exception):
+                    await http.delete(f"http://{w}:5000/browser/{sid}")
+        # only launched items reached the INSERT
+        await _mark_failed([sid for _, sid in doomed])
+
+    return [
+        {"session_id": sid, "error": errors[sid]} if sid in errors else
+        {"session_id": sid, "connect_url": f"ws://{public_host}:8000/session/{sid}"}
+        for sid in session_ids
+    ]
+
+async def _mark_failed(session_ids: list[str]) -> None:
+    """End the rows of creates that did not make it (no-op if never inserted)."""
+    bounds = [partitions.created_lower_bound(sid) for sid in session_ids]
+    since = min(bounds) if all(bounds) else partitions.hot_since()
+    try:
+        async with get_session() as db:
+            await db.execute(
+                text("UPDATE browser_sessions SET ended_at = NOW(), status='failed' "
+                     "WHERE session_id = ANY(:sids) AND created_at >= :since "
+                     "AND status = 'active'"),
+                {"sids": [uuid.UUID(sid) for sid in session_ids], "since": since},
+            )
+            await db.commit()
+    except Exception as exc:
+        # the caller is already failing; don't mask its error with ours
+        print(f"[create] could not mark {len(session_ids)} row(s) failed: {exc}")
+
+def _session_fields(
+    browser_id: str, port: int, keep_alive: bool, grace_period: int | None,
+) -> dict:
+    return {
+        "browserId": browser_id,
+        "port":     port,
+        "keepAlive": int(keep_alive),
+        "grace":    settings.detach_grace_period if grace_period is None else grace_period,
+        "attachGen": 0,
+    }
+
 async def touch_session(session_id: str) -> None:
     now = int(datetime.now(tz=timezone.utc).timestamp())
     await redis.zadd(settings.redis_last_active_key, {session_id: now})
 
-async def close_browser(session_id: str, reason: str = "client_closed") -> None:
-    worker_host = await redis.hget(settings.redis_session_map_key, session_id)
-    if not worker_host:
+async def attach_client(session_id: str) -> int | None:
+    """
+    Mark a client as attached: cancels any pending grace period and returns
+    the attach generation the caller must hand back to `detach_client`
+    (None if the session was closed in the meantime).
+    """
+    return await _attach_script(
+        keys=[f"session:{session_id}", settings.redis_detached_key],
+        args=[session_id],
+    )
+
+async def detach_client(session_id: str, gen: int) -> None:
+    """
+    Client socket dropped.  Keep-alive sessions are parked for their grace
+    period (the sweeper reaps them if nobody reattaches); all others close.
+    """
+    now = int(datetime.now(tz=timezone.utc).timestamp())
+    parked = await _detach_script(
+        keys=[f"session:{session_id}", settings.redis_detached_key],
+        args=[session_id, str(gen), now],
+    )
+    if parked == -1:
+        await close_browser(session_id, reason="client_disconnect")
+
+async def close_browser(
+    session_id: str,
+    reason: str = "client_closed",
+    notify_worker: bool = True,          # False when the browser is known dead
+) -> None:
+    # Redis first: whoever wins the release owns the rest of the teardown
+    released = await release_session(session_id)
+    if not released:
         return
+    worker_host = released["worker"]
 
-    async with ClientSession() as http:
-        await http.delete(f"http://{worker_host}:5000/browser/{session_id}")
-    await decrement_worker_load(worker_host)
+    if released["registeredAt"]:          # pending creates are not sessions yet
+        now = datetime.now(tz=timezone.utc).timestamp()
+        await metrics.record(redis, "closed")
+        await metrics.record(redis, "duration_s", now - float(released["reservedAt"]))
+        if released["tenant"]:
+            # billed from the moment the browser was up, hour by hour
+            await usage.record_session(
+                redis, released["tenant"], float(released["registeredAt"]), now,
+            )
 
-    # Redis cleanup
-    pipe = redis.pipeline()
-    pipe.hdel(settings.redis_session_map_key, session_id)
-    pipe.delete(f"session:{session_id}")
-    pipe.zrem(settings.redis_last_active_key, session_id)
-    await pipe.execute()
+    if notify_worker:
+        try:
+            async with ClientSession(timeout=_WORKER_RPC_TIMEOUT) as http:
+                await http.delete(f"http://{worker_host}:5000/browser/{session_id}")
+        except Exception as exc:
+            # slot is already released; the browser (if any) dies with its worker
+            print(f"[close] worker {worker_host} unreachable for {session_id}: {exc}")
 
-    # DB update
+    # DB update – the created_at bound lets Postgres skip cold partitions
+    since = partitions.created_lower_bound(session_id) or partitions.hot_since()
     async with get_session() as db:
         await db.execute(
-            text("UPDATE browser_sessions SET ended_at = NOW(), status='closed' WHERE session_id = :sid"),
-            {"sid": session_id},
+            text("UPDATE browser_sessions SET ended_at = NOW(), status='closed' "
+                 "WHERE session_id = :sid AND created_at >= :since"),
+            {"sid": session_id, "since": since},
         )
         await db.commit()
 
@@ -132,6 +551,10 @@ async def _timeout_sweeper() -> None:
     abs_s  = settings.session_timeout
 
     while True:
+        if not maintenance_lease.is_leader:
+            await asyncio.sleep(1)       # standby: poll so failover is quick
+            continue
+
         now_epoch = int(datetime.now(tz=timezone.utc).timestamp())
         idle_cutoff = now_epoch - idle_s
 
@@ -146,14 +569,20 @@ async def _timeout_sweeper() -> None:
                 text(
                     "SELECT session_id FROM browser_sessions "
                     "WHERE status='active' "
+                    "AND created_at >= :hot "           # hot partitions only
                     "AND (NOW() - created_at) > (:abs * INTERVAL '1 second')"
                 ),
-                {"abs": abs_s},
+                {"abs": abs_s, "hot": partitions.hot_since()},
             )
             expired_abs = list(rows)
 
+        # -- 3. keep-alive sessions whose grace period ran out -------------- #
+        expired_detached: Sequence[str] = await redis.zrangebyscore(
+            settings.redis_detached_key, "-inf", now_epoch
+        )
+
         # union
-        for sid in set(expired_idle) | set(map(str, expired_abs)):
+        for sid in set(expired_idle) | set(map(str, expired_abs)) | set(expired_detached):
             try:
                 await close_browser(sid, reason="timeout")
             except Exception as exc:
@@ -163,5 +592,163 @@ async def _timeout_sweeper() -> None:
         await asyncio.sleep(30)   # twice a minute
 
 
+# --------------------------------------------------------------------------- #
+# Reconciliation: Redis bookkeeping vs. what the workers actually run
+# --------------------------------------------------------------------------- #
+
+async def _reap_worker(worker_host: str) -> None:
+    """Worker stopped heart-beating: close its sessions and forget it."""
+    sids = await redis.smembers(f"{settings.redis_worker_sessions_prefix}{worker_host}")
+    for sid in sids:
+        await close_browser(sid, reason="worker_lost", notify_worker=False)
+
+    pipe = redis.pipeline()
+    pipe.zrem(settings.redis_workers_load_key, worker_host)
+    pipe.zrem(settings.redis_heartbeat_key, worker_host)
+    pipe.hdel(settings.redis_workers_state_key, worker_host)
+    pipe.hdel(settings.redis_workers_capacity_key, worker_host)     # re-published on rejoin
+    pipe.delete(f"{settings.redis_worker_inventory_prefix}{worker_host}")
+    pipe.delete(f"{settings.redis_worker_sessions_prefix}{worker_host}")
+    await pipe.execute()
+    print(f"[reconcile] reaped dead worker {worker_host} ({len(sids)} sessions)")
+
+
+async def _reconcile_worker(worker_host: str, snapshot_at: float, now: float) -> None:
+    # read the worker's inventory *before* our own view: any sid it lists was
+    # reserved before the snapshot, so missing from our set ⇒ released.
+    inventory = await redis.hgetall(f"{settings.redis_worker_inventory_prefix}{worker_host}")
+    known = await redis.smembers(f"{settings.redis_worker_sessions_prefix}{worker_host}")
+
+    # 1. sessions we think are there but the worker does not run
+    for sid in known - inventory.keys():
+        reserved_at, registered_at = await redis.hmget(
+            f"session:{sid}", "reservedAt", "registeredAt"
+        )
+        # both stamps are Redis TIME; the slack covers the gap between the
+        # worker reading its inventory and the heartbeat being written
+        if registered_at and float(registered_at) < snapshot_at - settings.reconcile_slack:
+            reason = "browser_lost"        # was launched before the snapshot
+        elif not registered_at and (not reserved_at or float(reserved_at) < now - settings.pending_timeout):
+            reason = "create_abandoned"    # gateway died mid-create
+        else:
+            continue                       # launch still in flight
+        await close_browser(sid, reason=reason)
+
+    # 2. browsers the worker runs that nobody routes to any more
+    orphans = inventory.keys() - known
+    if orphans:
+        killed = 0
+        async with ClientSession(timeout=_WORKER_RPC_TIMEOUT) as http:
+            for sid in orphans:
+                try:
+                    await http.delete(f"http://{worker_host}:5000/browser/{sid}")
+                    killed += 1
+                except Exception as exc:
+                    # next pass retries; keep going so step 3 still runs
+                    print(f"[reconcile] could not kill orphan {sid} on {worker_host}: {exc}")
+        print(f"[reconcile] killed {killed}/{len(orphans)} orphan browsers on {worker_host}")
+
+    # 3. load score := real session count
+    await _sync_load_script(
+        keys=[
+            settings.redis_workers_load_key,
+            f"{settings.redis_worker_sessions_prefix}{worker_host}",
+        ],
+        args=[worker_host],
+    )
+
+
+async def _reconciler() -> None:
+    """Runs forever; repairs load scores and reaps orphans on both sides."""
+    while True:
+        if not maintenance_lease.is_leader:
+            await asyncio.sleep(1)
+            continue
+
+        now = datetime.now(tz=timezone.utc).timestamp()
+        heartbeats = dict(await redis.zrange(settings.redis_heartbeat_key, 0, -1, withscores=True))
+        workers = set(await redis.zrange(settings.redis_workers_load_key, 0, -1)) | heartbeats.keys()
+
+        for w in workers:
+            try:
+                beat = heartbeats.get(w)
+                if beat is None or beat < now - settings.worker_dead_after:
+                    await _reap_worker(w)
+                else:
+                    await _reconcile_worker(w, beat, now)
+            except Exception as exc:
+                # never break the loop
+                print(f"[reconcile] {w}: {exc}")
+
+        await asyncio.sleep(settings.reconcile_interval)
+
+
+async def _session_event_listener() -> None:
+    """Workers publish browsers that died on their own; release them at once."""
+    while True:
+        try:
+            pubsub = redis.pubsub()
+            await pubsub.subscribe(settings.redis_session_events_channel)
+            async for msg in pubsub.listen():
+                if msg["type"] != "message":
+                    continue
+                event = json.loads(msg["data"])
+                await close_browser(
+                    event["session_id"],
+                    reason=event.get("reason", "worker_event"),
+                    notify_worker=False,
+                )
+        except Exception as exc:
+            print(f"[events] listener error, resubscribing: {exc}")
+            await asyncio.sleep(1)
+
+
+# --------------------------------------------------------------------------- #
+# Session-log partitions: pre-create upcoming days, archive + drop old ones
+# --------------------------------------------------------------------------- #
+
+async def _partition_maintainer() -> None:
+    """Runs forever; hourly on the leader is plenty for daily partitions."""
+    while True:
+        if not maintenance_lease.is_leader:
+            await asyncio.sleep(1)
+            continue
+        try:
+            async with engine.begin() as conn:
+                await partitions.ensure_partitions(conn)
+            await partitions.archive_expired(engine)
+        except Exception as exc:
+            # never break the loop; a failed upload keeps its partition
+            print(f"[partitions] maintenance failed: {exc}")
+        await asyncio.sleep(3600)
+
+
+# --------------------------------------------------------------------------- #
+# Usage metering: fold Redis counters into usage_rollups
+# --------------------------------------------------------------------------- #
+
+async def _usage_folder() -> None:
+    """Runs forever; idempotent, so a failover mid-fold is harmless."""
+    while True:
+        if not maintenance_lease.is_leader:
+            await asyncio.sleep(1)
+            continue
+        try:
+            await usage.fold(redis)
+        except Exception as exc:
+            # never break the loop; the counters stay in Redis for the next try
+            print(f"[usage] fold failed: {exc}")
+        await asyncio.sleep(settings.usage_fold_interval)
+
+
 def start_background_tasks(loop: asyncio.AbstractEventLoop) -> None:
+    maintenance_lease.start(loop)
     loop.create_task(_timeout_sweeper())
+    loop.create_task(_reconciler())
+    loop.create_task(_partition_maintainer())
+    loop.create_task(_usage_folder())
+    loop.create_task(_session_event_listener())     # every replica; close is idempotent
+
+
+async def stop_background_tasks() -> None:
+    await maintenance_lease.stop()
@@ -0,0 +1,173 @@
+"""
+Per-tenant usage metering, rolled up by the hour.
+
+Closing a session and relaying CDP traffic bump Redis counters
+
+    usage:<tenant>:<epoch-hour>   hash  sessions / browser_seconds / bytes
+    usage_buckets                 zset  "<tenant>:<epoch-hour>" → epoch-hour
+
+and the leader periodically folds them into `usage_rollups`.  A session's
+browser-seconds are split across every hour it was up, so a closing
+session can still add to an hour long past; hashes therefore outlive their
+hour by SESSION_TIMEOUT plus a couple of days, and the fold keeps tracking
+hours back to SESSION_TIMEOUT.  The fold writes Redis' *absolute* totals
+(GREATEST, never +=), so re-running it – or two replicas racing – cannot
+double count.
+"""
+# gateway/usage.py
+from __future__ import annotations
+
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from config import get_settings, Settings
+from db import get_session
+from models import UsageRollup
+
+settings: Settings = get_settings()
+
+BUCKETS_KEY = "usage_buckets"
+_KEY_TTL = settings.session_timeout + 3600 * 50
+FIELDS = ("sessions", "browser_seconds", "bytes")
+FLUSH_BYTES = 1 << 20            # relay meters report at least every MiB
+
+
+def _hour(ts: float | None = None) -> int:
+    return int((ts or time.time()) // 3600)
+
+
+def _key(tenant: str, hour: int) -> str:
+    return f"usage:{tenant}:{hour}"
+
+
+def _queue(pipe, tenant: str, hour: int, **incr: float) -> None:
+    key = _key(tenant, hour)
+    for field, n in incr.items():
+        if isinstance(n, float):
+            pipe.hincrbyfloat(key, field, n)
+        else:
+            pipe.hincrby(key, field, n)
+    pipe.expire(key, _KEY_TTL)
+    pipe.zadd(BUCKETS_KEY, {f"{tenant}:{hour}": hour})
+
+
+async def _bump(redis, tenant: str, **incr: float) -> None:
+    pipe = redis.pipeline(transaction=False)
+    _queue(pipe, tenant, _hour(), **incr)
+    await pipe.execute()
+
+
+def _split_hours(start: float, end: float) -> list[tuple[int, float]]:
+    """(epoch-hour, seconds) for each hour that [start, end) overlaps."""
+    out = []
+    while start < end:
+        hour = _hour(start)
+        cut = min(end, (hour + 1) * 3600)
+        out.append((hour, cut - start))
+        start = cut
+    return out
+
+
+async def record_session(redis, tenant: str, started_at: float, ended_at: float) -> None:
+    """
+    One session ended (called from close_browser): it counts once, in the
+    hour it closed, and its browser-seconds go to the hours they were spent in.
+    """
+    pipe = redis.pipeline(transaction=False)
+    for hour, seconds in _split_hours(started_at, ended_at):
+        _queue(pipe, tenant, hour, browser_seconds=float(seconds))
+    _queue(pipe, tenant, _hour(ended_at), sessions=1)
+    await pipe.execute()
+
+
+class ByteMeter:
+    """Counts relayed bytes for one connection; reports in ≥ 1 MiB steps."""
+
+    def __init__(self, redis, tenant: str) -> None:
+        self._redis = redis
+        self._tenant = tenant
+        self._pending = 0
+
+    async def add(self, n: int) -> None:
+        self._pending += n
+        if self._pending >= FLUSH_BYTES:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if self._pending:
+            n, self._pending = self._pending, 0
+            await _bump(self._redis, self._tenant, bytes=n)
+
+
+def _row(tenant: str, hour: int, h: dict[str, str]) -> dict:
+    return {
+        "tenant_id": uuid.UUID(tenant),
+        "hour": datetime.fromtimestamp(hour * 3600, tz=timezone.utc),
+        "sessions": int(h.get("sessions", 0)),
+        "browser_seconds": float(h.get("browser_seconds", 0)),
+        "bytes": int(h.get("bytes", 0)),
+    }
+
+
+async def _live_buckets(redis, tenant: str | None = None) -> list[tuple[str, int, dict]]:
+    members = await redis.zrange(BUCKETS_KEY, 0, -1)
+    pairs = [m.rsplit(":", 1) for m in members]
+    if tenant:
+        pairs = [p for p in pairs if p[0] == tenant]
+    pipe = redis.pipeline(transaction=False)
+    for t, hour in pairs:
+        pipe.hgetall(_key(t, int(hour)))
+    return [(t, int(hour), h) for (t, hour), h in zip(pairs, await pipe.execute()) if h]
+
+
+async def fold(redis) -> int:
+    """Upsert every live Redis bucket into usage_rollups; returns rows written."""
+    buckets = await _live_buckets(redis)
+    async with get_session() as db:
+        for i in range(0, len(buckets), 1000):          # stay under the bind limit
+            stmt = insert(UsageRollup).values([_row(*b) for b in buckets[i:i + 1000]])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[UsageRollup.tenant_id, UsageRollup.hour],
+                set_={f: func.greatest(getattr(UsageRollup, f), getattr(stmt.excluded, f))
+                      for f in FIELDS},
+            )
+            await db.execute(stmt)
+        await db.commit()
+    # no session outlives SESSION_TIMEOUT, so older hours receive no more
+    # browser-seconds – stop tracking them
+    cutoff = _hour(time.time() - settings.session_timeout) - 2
+    await redis.zremrangebyscore(BUCKETS_KEY, "-inf", cutoff)
+    return len(buckets)
+
+
+async def query(
+    redis, tenant_id: uuid.UUID, since: datetime, until: datetime, granularity: str = "hour",
+) -> list[dict]:
+    """
+    Usage per hour (or UTC day) in [since, until).  Buckets not folded yet
+    are read from Redis so the current hour is always up to date.
+    """
+    async with get_session() as db:
+        rows = (await db.execute(
+            select(UsageRollup)
+            .where(UsageRollup.tenant_id == tenant_id)
+            .where(UsageRollup.hour >= since, UsageRollup.hour < until)
+        )).scalars().all()
+    by_hour = {r.hour: {f: getattr(r, f) for f in FIELDS} for r in rows}
+    for t, hour, h in await _live_buckets(redis, str(tenant_id)):
+        live = _row(t, hour, h)
+        if since <= live["hour"] < until:
+            prev = by_hour.get(live["hour"], {})
+            by_hour[live["hour"]] = {f: max(live[f], prev.get(f, 0)) for f in FIELDS}
+
+    out: dict[datetime, dict] = {}
+    for hour, vals in sorted(by_hour.items()):
+        start = hour.replace(hour=0) if granularity == "day" else hour
+        acc = out.setdefault(start, dict.fromkeys(FIELDS, 0))
+        for f in FIELDS:
+            acc[f] += vals[f]
+    return [{"start": start, **vals} for start, vals in out.items()]
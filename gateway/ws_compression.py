@@ -0,0 +1,153 @@
+"""
+permessage-deflate for the client-facing CDP socket, tuned for CDP.
+
+uvicorn's stock websockets protocol compresses *every* message with zlib
+defaults on the event loop.  This protocol (wired in by serve.py) instead:
+
+* negotiates the extension only if WS_DEFLATE is on and the client offers it,
+  with WS_DEFLATE_WINDOW_BITS / WS_DEFLATE_LEVEL;
+* sends messages under WS_DEFLATE_THRESHOLD bytes uncompressed (rsv1 unset)
+  – most CDP replies are tiny, and deflate only costs CPU there;
+* compresses messages ≥ WS_DEFLATE_OFFLOOP bytes (screenshots, DOM dumps)
+  in a thread with the same encoder, so one big frame cannot stall every
+  other session on this process;
+* adds the payload bytes before / after compression to the metrics
+  counters `ws_raw_bytes` / `ws_wire_bytes` when a connection closes.
+
+The gateway → worker → Chromium hops stay uncompressed (`compression=None`).
+"""
+# gateway/ws_compression.py
+from __future__ import annotations
+
+import asyncio
+import os
+
+from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol
+from websockets.exceptions import InvalidState
+from websockets.extensions.permessage_deflate import (
+    PerMessageDeflate,
+    ServerPerMessageDeflateFactory,
+)
+from websockets.frames import CTRL_OPCODES, OP_CONT, Frame, Opcode
+from websockets.legacy.protocol import State
+
+import metrics
+from session_manager import redis
+
+ENABLED: bool = os.getenv("WS_DEFLATE", "1") == "1"
+LEVEL: int = int(os.getenv("WS_DEFLATE_LEVEL", "6"))                    # zlib 1–9
+WINDOW_BITS: int = int(os.getenv("WS_DEFLATE_WINDOW_BITS", "15"))       # 8–15
+THRESHOLD: int = int(os.getenv("WS_DEFLATE_THRESHOLD", "1024"))          # bytes
+OFFLOOP: int = int(os.getenv("WS_DEFLATE_OFFLOOP", str(256 * 1024)))     # bytes
+
+
+class ThresholdDeflate(PerMessageDeflate):
+    """PerMessageDeflate that leaves small messages alone and counts bytes."""
+
+    def __init__(self, *args, threshold: int = THRESHOLD, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.threshold = threshold
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self._passthrough = False       # current (fragmented) message is uncompressed
+
+    def encode(self, frame: Frame) -> Frame:
+        if frame.opcode in CTRL_OPCODES:
+            return frame
+        if frame.opcode is not OP_CONT:
+            self._passthrough = len(frame.data) < self.threshold
+        if self._passthrough:
+            # RFC 7692 §6: a message may go out uncompressed; the shared
+            # LZ77 window is untouched, so context takeover stays valid
+            self.raw_bytes += len(frame.data)
+            self.wire_bytes += len(frame.data)
+            return frame
+        out = super().encode(frame)
+        self.raw_bytes += len(frame.data)
+        self.wire_bytes += len(out.data)
+        return out
+
+
+class DeflateFactory(ServerPerMessageDeflateFactory):
+    def __init__(self, threshold: int = THRESHOLD, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.threshold = threshold
+
+    def process_request_params(self, params, accepted_extensions):
+        response, ext = super().process_request_params(params, accepted_extensions)
+        return response, ThresholdDeflate(
+            ext.remote_no_context_takeover,
+            ext.local_no_context_takeover,
+            ext.remote_max_window_bits,
+            ext.local_max_window_bits,
+            ext.compress_settings,
+            threshold=self.threshold,
+        )
+
+
+class _Encoded:
+    """Extension stand-in that returns an already-encoded frame."""
+
+    def __init__(self, frame: Frame) -> None:
+        self.frame = frame
+
+    def encode(self, frame: Frame) -> Frame:
+        return self.frame
+
+
+class CompressedWebSocketProtocol(WebSocketProtocol):
+    """uvicorn's websockets protocol with the deflate policy above."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.available_extensions = [DeflateFactory(
+            threshold=THRESHOLD,
+            server_max_window_bits=WINDOW_BITS,
+            compress_settings={"level": LEVEL},
+        )] if ENABLED else []
+        # one frame at a time through the shared encoder, in send order
+        self._encode_lock = asyncio.Lock()
+
+    def _deflate(self) -> ThresholdDeflate | None:
+        for ext in self.extensions:
+            if isinstance(ext, ThresholdDeflate):
+                return ext
+        return None
+
+    async def write_frame(
+        self, fin: bool, opcode: int, data: bytes, *, _state: int = State.OPEN
+    ) -> None:
+        ext = self._deflate()
+        if ext is None or opcode in CTRL_OPCODES:
+            return await super().write_frame(fin, opcode, data, _state=_state)
+
+        async with self._encode_lock:
+            if opcode == OP_CONT or len(data) < max(OFFLOOP, ext.threshold):
+                return await super().write_frame(fin, opcode, data, _state=_state)
+
+            frame = await asyncio.to_thread(ext.encode, Frame(Opcode(opcode), data, fin))
+            if self.state is not _state:
+                raise InvalidState(
+                    f"Cannot write to a WebSocket in the {self.state.name} state"
+                )
+            # serialize() validates the plain frame, then our slot in the
+            # extension chain hands back the one compressed off-loop
+            chain = [_Encoded(frame) if e is ext else e for e in self.extensions]
+            self.transport.write(Frame(Opcode(opcode), data, fin).serialize(
+                mask=self.is_client, extensions=chain,
+            ))
+            await self.drain()
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        ext = self._deflate()
+        super().connection_lost(exc)
+        if ext is not None and ext.raw_bytes:
+            self.loop.create_task(_flush(ext.raw_bytes, ext.wire_bytes))
+
+
+async def _flush(raw: int, wire: int) -> None:
+    try:
+        await metrics.record(redis, "ws_raw_bytes", raw)
+        await metrics.record(redis, "ws_wire_bytes", wire)
+    except Exception as exc:
+        print(f"[ws] could not record compression stats: {exc}")
@@ -0,0 +1,70 @@
+# test_launch_profile.py  –  launch profiles: gateway ⇄ worker contract
+#
+# The gateway validates `profile` and forwards it verbatim; the worker parses
+# it again with its own copy of the model (the two images are built from
+# separate contexts).  These tests fail as soon as the copies diverge.
+import importlib.util
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+
+
+def _load(path: str, name: str):
+    spec = importlib.util.spec_from_file_location(name, ROOT / path)
+    module = sys.modules[name] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+gateway_schema = _load("gateway/schema.py", "gateway_schema")
+launch_profile = _load("worker/launch_profile.py", "worker_launch_profile")
+
+
+def _contract(model) -> dict:
+    """JSON schema without the prose (titles, docstrings)."""
+    def strip(node):
+        if isinstance(node, dict):
+            return {k: strip(v) for k, v in node.items() if k not in ("title", "description")}
+        if isinstance(node, list):
+            return [strip(v) for v in node]
+        return node
+    return strip(model.model_json_schema())
+
+
+def test_launch_profile_models_match():
+    assert _contract(gateway_schema.LaunchProfile) == _contract(launch_profile.LaunchProfile)
+
+
+def test_gateway_profile_parses_on_worker():
+    sent = gateway_schema.LaunchProfile(
+        block_resource_types=["image", "font"], block_url_patterns=["*://ads.example/*"],
+        viewport={"width": 1024, "height": 768}, low_memory=True, template="news",
+    )
+    got = launch_profile.LaunchProfile.model_validate_json(sent.model_dump_json())
+    assert got.model_dump() == sent.model_dump()
+
+
+def _attach(session_id: str = "S1") -> str:
+    return json.dumps({"method": "Target.attachedToTarget", "params": {
+        "sessionId": session_id, "targetInfo": {"type": "page"},
+    }})
+
+
+def test_injector_swallows_its_replies_in_any_shape():
+    injector = launch_profile.BlockingInjector(["*.css*"])
+    forward, cmds = injector.on_browser_message(_attach())
+    assert forward and len(cmds) == 2
+    first, second = (json.loads(c)["id"] for c in cmds)
+
+    # key order and whitespace are Chromium's business, not ours
+    assert injector.on_browser_message(f'{{"id":{first},"result":{{}}}}') == (False, [])
+    assert injector.on_browser_message(
+        f'{{ "sessionId": "S1", "result": {{}}, "id" : {second} }}') == (False, [])
+    # client replies and unparseable frames pass straight through
+    assert injector.on_browser_message('{"id":7,"result":{}}') == (True, [])
+    injector.on_browser_message(_attach("S2"))
+    assert injector.on_browser_message('{"id": 7}') == (True, [])
+    assert injector.on_browser_message('["id"]') == (True, [])
+    assert injector.on_browser_message('{"id" not json') == (True, [])
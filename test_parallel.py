@@ -8,6 +8,13 @@ payload = {
     "record": True           # flip ‟on” for the recorder
 }
 
+# LITE_PROFILE=1 → scraper profile; compare wall time against a default run
+if os.environ.get("LITE_PROFILE"):
+    payload["profile"] = {
+        "block_resource_types": ["image", "font", "media"],
+        "low_memory": True,
+    }
+
 # ╭──────────────── helper ─────────────────╮
 async def create_session(http) -> dict:
     r = await http.post(f"{GATEWAY}/sessions", json=payload)
@@ -37,6 +44,7 @@ async def main(n: int):
     await asyncio.gather(*(run_job(i, u) for i, u in enumerate(urls)))
     elapsed = time.perf_counter() - start
     print(f"\nFinished {n} sessions in {elapsed:0.2f}s "
+          f"[profile={'lite' if 'profile' in payload else 'default'}] "
           f"(avg {elapsed/n:0.2f}s each → shows parallelism)")
 
 if __name__ == "__main__":
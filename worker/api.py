@@ -3,18 +3,29 @@ Worker service API  – one Chromium **per session**.
 
 On start-up the worker registers **its own IP address** (or explicit env
 WORKER_HOST) in the Redis load-balancer set so the gateway can reach it.
+
+SIGTERM (via serve.py) or POST /drain starts a graceful drain: no new
+placements, live sessions run until they end or DRAIN_DEADLINE passes, then
+we deregister – and, for SIGTERM, exit.
 """
 
 from __future__ import annotations
 
+import asyncio
+import json
 import os
 import socket
+import time
+from typing import Callable
 
 import redis.asyncio as aioredis
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 
+import profile_templates
 from browser_manager import BrowserManager
+from memory_governor import MemoryGovernor
+from launch_profile import LaunchProfile
 
 from ws_proxy import router as ws_router
 
@@ -22,6 +33,15 @@ from ws_proxy import router as ws_router
 
 REDIS_URL: str = os.getenv("REDIS_URL", "redis://redis:6379/0")
 WORKERS_ZSET: str = os.getenv("REDIS_WORKERS_LOAD_KEY", "workers_load")
+HEARTBEAT_ZSET: str = os.getenv("REDIS_HEARTBEAT_KEY", "workers_heartbeat")
+INVENTORY_PREFIX: str = os.getenv("REDIS_INVENTORY_PREFIX", "worker_inventory:")
+STATE_HASH: str = os.getenv("REDIS_WORKERS_STATE_KEY", "workers_state")
+CAPACITY_HASH: str = os.getenv("REDIS_WORKERS_CAPACITY_KEY", "workers_capacity")
+MAX_CONTEXTS: int = int(os.getenv("MAX_CONTEXTS", "20"))             # published capacity
+EVENTS_CHANNEL: str = os.getenv("REDIS_SESSION_EVENTS_CHANNEL", "session_events")
+HEARTBEAT_INTERVAL: int = int(os.getenv("HEARTBEAT_INTERVAL", "10"))
+LAUNCH_CONCURRENCY: int = int(os.getenv("LAUNCH_CONCURRENCY", "8"))   # batch launches in flight
+DRAIN_DEADLINE: int = int(os.getenv("DRAIN_DEADLINE", "300"))          # s sessions may keep running
 
 # Which host string should the gateway use to reach me?
 WORKER_HOST: str = (
@@ -30,6 +50,10 @@ WORKER_HOST: str = (
 )
 
 redis = aioredis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+governor: MemoryGovernor | None = None
+drain: dict | None = None          # {"started_at", "deadline", "exit", "done"} once draining
+deregistered = False
+request_exit: Callable[[], None] | None = None    # set by serve.py: graceful uvicorn exit
 
 
 # ─────────────────────────── FastAPI app ─────────────────────────── #
@@ -37,12 +61,140 @@ redis = aioredis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
 app = FastAPI(title="Browser Worker")
 app.include_router(ws_router)  
 
+# KEYS: inventory hash, heartbeat zset, workers_load, capacity hash
+# ARGV: worker, inventory ttl, capacity, rejoin (0/1), sid1, launched1, …
+# The heartbeat score is Redis TIME – the clock the gateway stamps
+# registeredAt with – so it is comparable with it.  With rejoin=1 a worker
+# the gateway reaped (late heartbeats, network blip) is placed again.
+_HEARTBEAT_LUA = """
+redis.call('DEL', KEYS[1])
+if #ARGV > 4 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 5))
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+local t = redis.call('TIME')
+redis.call('ZADD', KEYS[2], t[1] .. '.' .. string.format('%06d', tonumber(t[2])), ARGV[1])
+if ARGV[4] == '1' and redis.call('ZADD', KEYS[3], 'NX', 0, ARGV[1]) == 1 then
+    redis.call('HSET', KEYS[4], ARGV[1], ARGV[3])
+    return 1
+end
+return 0
+"""
+_heartbeat_script = redis.register_script(_HEARTBEAT_LUA)
+
+
+async def _publish_inventory() -> None:
+    """
+    Replace our published session list (sid → launch epoch) and bump the
+    heartbeat atomically, so the gateway can treat the heartbeat score as
+    the snapshot time of the inventory.
+    """
+    bm = await BrowserManager.get()
+    inventory = await bm.inventory()
+    rejoined = await _heartbeat_script(
+        keys=[f"{INVENTORY_PREFIX}{WORKER_HOST}", HEARTBEAT_ZSET, WORKERS_ZSET, CAPACITY_HASH],
+        args=[WORKER_HOST, HEARTBEAT_INTERVAL * 3, MAX_CONTEXTS,
+              int(drain is None and not deregistered),
+              *[x for kv in inventory.items() for x in kv]],
+    )
+    if rejoined:
+        print(f"[worker] was missing from '{WORKERS_ZSET}', re-registered")
+
+
+async def _heartbeat_loop() -> None:
+    while not deregistered:
+        try:
+            await _publish_inventory()
+        except Exception as exc:
+            # never break the loop
+            print(f"[worker] heartbeat failed: {exc}")
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+
+async def _report_lost(session_id: str, reason: str) -> None:
+    """Tell the gateway a browser died so it releases the slot right away."""
+    await redis.publish(EVENTS_CHANNEL, json.dumps({
+        "session_id": session_id,
+        "worker": WORKER_HOST,
+        "reason": reason,
+    }))
+
+
 @app.on_event("startup")
 async def _register_self() -> None:
     # score 0 → least loaded
     await redis.zadd(WORKERS_ZSET, {WORKER_HOST: 0}, nx=True)
+    await redis.hset(CAPACITY_HASH, WORKER_HOST, MAX_CONTEXTS)
     print(f"[worker] registered '{WORKER_HOST}' in Redis zset '{WORKERS_ZSET}'")
 
+    await asyncio.to_thread(profile_templates.prepare_sessions_dir)
+
+    global governor
+    bm = await BrowserManager.get()
+    bm.on_lost = _report_lost
+    asyncio.get_running_loop().create_task(_heartbeat_loop())
+    governor = MemoryGovernor(
+        bm, redis, WORKER_HOST, STATE_HASH, WORKERS_ZSET,
+        draining=lambda: drain is not None or deregistered,
+    )
+    asyncio.get_running_loop().create_task(governor.run())
+    # builds new templates; also re-warms old ones if PROFILE_TEMPLATE_REFRESH
+    asyncio.get_running_loop().create_task(profile_templates.refresh_loop(bm.playwright))
+
+
+async def _deregister() -> None:
+    global deregistered
+    deregistered = True
+    pipe = redis.pipeline()
+    pipe.zrem(WORKERS_ZSET, WORKER_HOST)
+    pipe.zrem(HEARTBEAT_ZSET, WORKER_HOST)
+    pipe.hdel(STATE_HASH, WORKER_HOST)
+    pipe.hdel(CAPACITY_HASH, WORKER_HOST)
+    pipe.delete(f"{INVENTORY_PREFIX}{WORKER_HOST}")
+    await pipe.execute()
+    print(f"[worker] deregistered '{WORKER_HOST}' from '{WORKERS_ZSET}'")
+
+
+async def _drain_until_empty() -> None:
+    bm = await BrowserManager.get()
+    while await bm.inventory() and time.time() < drain["deadline"]:
+        await asyncio.sleep(1)
+
+    leftovers = list(await bm.inventory())
+    for sid in leftovers:                     # deadline hit: hand them back
+        await bm.close_browser(sid)
+        await _report_lost(sid, "worker_drained")
+    print(f"[worker] drain finished, {len(leftovers)} sessions closed at deadline")
+
+    await _deregister()
+    drain["done"] = True
+    _exit_if_asked()
+
+
+def _exit_if_asked() -> None:
+    if not drain["exit"]:
+        return
+    if request_exit is None:
+        print("[worker] drained; not started by serve.py, stop the process yourself")
+    else:
+        request_exit()                        # uvicorn's normal shutdown path
+
+
+async def start_drain(deadline_s: int, exit_when_done: bool = False) -> None:
+    """Stop new placements now; deregister once empty or at the deadline."""
+    global drain
+    if drain is not None:
+        drain["exit"] = drain["exit"] or exit_when_done
+        if drain["done"]:                     # POST /drain already emptied us
+            _exit_if_asked()
+        return
+    drain = {"started_at": time.time(), "deadline": time.time() + deadline_s,
+             "exit": exit_when_done, "done": False}
+    # overrides e.g. memory_pressure – a draining worker never comes back
+    await redis.hset(STATE_HASH, WORKER_HOST, "draining")
+    print(f"[worker] draining, deadline in {deadline_s}s")
+    asyncio.get_running_loop().create_task(_drain_until_empty())
+
 
 @app.on_event("shutdown")
 async def _deregister_self() -> None:
@@ -50,20 +202,41 @@ async def _deregister_self() -> None:
     Remove this host from the workers_load ZSET so the gateway
     won’t try to route new sessions here after we exit.
     """
-    await redis.zrem(WORKERS_ZSET, WORKER_HOST)
-    print(f"[worker] deregistered '{WORKER_HOST}' from '{WORKERS_ZSET}'")
+    if not deregistered:
+        await _deregister()
     
 # ---------- Pydantic model ---------- #
 class NewCtxReq(BaseModel):
     session_id: str
+    keep_alive: bool = False    # gateway owns the grace period; we just don't kill
+    profile: LaunchProfile | None = None
+
+
+class NewCtxBatchReq(BaseModel):
+    sessions: list[NewCtxReq]
+
+
+class DrainReq(BaseModel):
+    deadline_s: int = DRAIN_DEADLINE
 
 
 # ---------- RPC endpoints ---------- #
+def _refuse_if_draining() -> None:
+    # reservations made just before the drain started land here
+    if drain is not None:
+        raise HTTPException(status_code=503, detail="worker is draining")
+
+
 @app.post("/browser")
 async def new_browser(req: NewCtxReq):
+    _refuse_if_draining()
     bm = await BrowserManager.get()
     try:
-        port, browser_guid = await bm.new_browser(req.session_id)
+        port, browser_guid = await bm.new_browser(
+            req.session_id, keep_alive=req.keep_alive, profile=req.profile,
+        )
+    except profile_templates.TemplateNotFound as exc:
+        raise HTTPException(status_code=400, detail=f"unknown template {exc}")
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
@@ -71,6 +244,88 @@ async def new_browser(req: NewCtxReq):
     return {"browserId": browser_guid, "port": port}
 
 
+@app.post("/browsers")
+async def new_browsers(req: NewCtxBatchReq):
+    """Launch a batch in parallel; failures are reported per session."""
+    _refuse_if_draining()
+    bm = await BrowserManager.get()
+    gate = asyncio.Semaphore(LAUNCH_CONCURRENCY)
+
+    async def launch(item: NewCtxReq) -> dict:
+        async with gate:
+            try:
+                port, browser_guid = await bm.new_browser(
+                    item.session_id, keep_alive=item.keep_alive, profile=item.profile,
+                )
+            except Exception as exc:
+                return {"error": str(exc)}
+        return {"browserId": browser_guid, "port": port}
+
+    results = await asyncio.gather(*(launch(item) for item in req.sessions))
+    return {"results": {
+        item.session_id: res for item, res in zip(req.sessions, results)
+    }}
+
+
+@app.get("/browsers")
+async def list_browsers():
+    """Authoritative list of live sessions on this worker (sid → launch epoch)."""
+    bm = await BrowserManager.get()
+    return {"worker": WORKER_HOST, "sessions": await bm.inventory()}
+
+
+@app.post("/drain", status_code=202)
+async def begin_drain(req: DrainReq):
+    await start_drain(req.deadline_s)
+    return await drain_status()
+
+
+@app.get("/drain")
+async def drain_status():
+    bm = await BrowserManager.get()
+    return {
+        "draining":     drain is not None,
+        "deregistered": deregistered,
+        "remaining":    len(await bm.inventory()),
+        "deadline":     drain["deadline"] if drain else None,
+    }
+
+
+@app.get("/memory")
+async def memory_status():
+    """Latest pressure reading, governor stage and recent actions."""
+    if governor is None:
+        raise HTTPException(status_code=503, detail="governor not started")
+    return governor.status()
+
+
+@app.get("/templates")
+async def list_templates():
+    return {"templates": profile_templates.list_templates()}
+
+
+@app.post("/templates/{name}/refresh", status_code=202)
+async def refresh_template(name: str):
+    """Re-warm a template in the background; sessions keep cloning the old one."""
+    try:
+        if profile_templates.refreshing(name):
+            raise HTTPException(status_code=409, detail="refresh already in progress")
+    except profile_templates.TemplateNotFound:
+        raise HTTPException(status_code=404, detail="unknown template")
+    bm = await BrowserManager.get()
+    asyncio.get_running_loop().create_task(_refresh_template(name, bm.playwright))
+    return {"status": "refreshing", "template": name}
+
+
+async def _refresh_template(name: str, pw) -> None:
+    try:
+        await profile_templates.refresh(name, pw)
+    except profile_templates.RefreshInProgress:
+        print(f"[templates] {name}: another worker started refreshing first")
+    except Exception as exc:
+        print(f"[templates] {name}: refresh failed: {exc}")
+
+
 @app.delete("/browser/{session_id}")
 async def close_browser(session_id: str):
     bm = await BrowserManager.get()
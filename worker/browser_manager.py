@@ -5,7 +5,12 @@ BrowserManager 2.0
 * One **Chromium process per session** (not per worker).
 * Each process listens on a **unique** remote-debugging port so multiple
   browsers can run side-by-side in the same container.
-* Keeps a registry  session_id → (browser, port).
+* Keeps a registry  session_id → BrowserEntry(browser, port, guid, …).
+* Keep-alive sessions outlive their CDP relay; only the gateway closes them.
+* Sessions may start from a warm profile template (see profile_templates);
+  their private user-data-dir is deleted on close.
+* Browsers that die on their own (crash, OOM-kill) are dropped from the
+  registry immediately and reported through `on_lost`.
 * Safe under concurrency with an asyncio lock.
 """
 
@@ -14,10 +19,16 @@ from __future__ import annotations
 import asyncio
 import contextlib
 import socket
-from typing import Dict, Optional, Tuple
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple, Union
 
 from playwright.async_api import async_playwright, Browser, BrowserContext
 
+import profile_templates
+from launch_profile import LaunchProfile
+
 
 def _pick_free_port() -> int:
     """Ask the OS for an unused TCP port and immediately release it."""
@@ -26,13 +37,26 @@ def _pick_free_port() -> int:
         return s.getsockname()[1]
 
 
+@dataclass
+class BrowserEntry:
+    browser: Union[Browser, BrowserContext]        # context for template launches
+    port: int
+    guid: str
+    keep_alive: bool = False                       # survives relay drops
+    profile: Optional[LaunchProfile] = None        # blocks applied by ws_proxy
+    user_data_dir: Optional[Path] = None           # private template clone
+    launched_at: float = field(default_factory=time.time)
+
+
 class BrowserManager:
     _instance: Optional["BrowserManager"] = None
 
     def __init__(self) -> None:
         self._pw = None                            # Playwright instance
-        self._browsers: Dict[str, Tuple[Browser, int, str]] = {} # sid → (browser, port, guid)
+        self._browsers: Dict[str, BrowserEntry] = {}   # sid → entry
         self._lock = asyncio.Lock()
+        # async callback(session_id, reason) for browsers that died on their own
+        self.on_lost: Optional[Callable[[str, str], Awaitable[None]]] = None
 
     # ------------------------------------------------------------------ #
     # Singleton accessor
@@ -47,17 +71,46 @@ class BrowserManager:
     async def _ensure_playwright(self) -> None:
         if self._pw is None:
             self._pw = await async_playwright().start()
+
+    @property
+    def playwright(self):
+        return self._pw
     
     async def get_info(self, session_id: str) -> tuple[int, str] | None:
         async with self._lock:
             entry = self._browsers.get(session_id)
-        return (entry[1], entry[2]) if entry else None # entry = (browser, port, guid)
+        return (entry.port, entry.guid) if entry else None
+
+    async def is_keep_alive(self, session_id: str) -> bool:
+        async with self._lock:
+            entry = self._browsers.get(session_id)
+        return bool(entry and entry.keep_alive)
+
+    async def get_profile(self, session_id: str) -> LaunchProfile | None:
+        async with self._lock:
+            entry = self._browsers.get(session_id)
+        return entry.profile if entry else None
+
+    async def endpoints(self) -> Dict[str, Tuple[int, str]]:
+        """sid → (debug port, browser guid) for every live browser."""
+        async with self._lock:
+            return {sid: (e.port, e.guid) for sid, e in self._browsers.items()}
+
+    async def inventory(self) -> Dict[str, float]:
+        """Authoritative session list: sid → launch epoch."""
+        async with self._lock:
+            return {sid: e.launched_at for sid, e in self._browsers.items()}
 
 
     # ------------------------------------------------------------------ #
     # Public API – create / close browsers
     # ------------------------------------------------------------------ #
-    async def new_browser(self, session_id: str) -> Tuple[int, str]:
+    async def new_browser(
+        self,
+        session_id: str,
+        keep_alive: bool = False,
+        profile: LaunchProfile | None = None,
+    ) -> Tuple[int, str]:
         """
         Launch a new Chromium process and return (debug_port, browser_guid).
 
@@ -65,17 +118,30 @@ class BrowserManager:
             ws://<worker-host>:<port>/devtools/browser/<browser_guid>
         """
         port = _pick_free_port()
-
-        # Launch standalone Chromium
-        browser = await self._pw.chromium.launch(
-            headless=True,
-            args=[
-                f"--remote-debugging-port={port}",
-                "--remote-debugging-address=0.0.0.0",   # expose to gateway container
-                "--no-sandbox",
-                "--disable-dev-shm-usage",
-            ],
-        )
+        args = [
+            f"--remote-debugging-port={port}",
+            "--remote-debugging-address=0.0.0.0",   # expose to gateway container
+            "--no-sandbox",
+            "--disable-dev-shm-usage",
+            *(profile.chromium_args() if profile else []),
+        ]
+
+        user_data_dir = None
+        if profile and profile.template:
+            # warm start: CoW clone of the template's user-data-dir
+            user_data_dir = await profile_templates.clone(profile.template, session_id)
+            try:
+                browser = await self._pw.chromium.launch_persistent_context(
+                    str(user_data_dir), headless=True, args=args, no_viewport=True,
+                )
+            except Exception:
+                await profile_templates.discard(user_data_dir)
+                raise
+            lost_event = "close"
+        else:
+            # Launch standalone Chromium
+            browser = await self._pw.chromium.launch(headless=True, args=args)
+            lost_event = "disconnected"
 
         # Grab browser GUID via /json/version
         import aiohttp, json
@@ -86,7 +152,14 @@ class BrowserManager:
 
         # book-keeping
         async with self._lock:
-            self._browsers[session_id] = (browser, port, browser_guid)
+            self._browsers[session_id] = BrowserEntry(
+                browser, port, browser_guid, keep_alive,
+                profile=profile, user_data_dir=user_data_dir,
+            )
+        browser.on(
+            lost_event,
+            lambda _: asyncio.create_task(self._on_disconnected(session_id, browser)),
+        )
 
         return port, browser_guid
 
@@ -96,5 +169,22 @@ class BrowserManager:
             entry = self._browsers.pop(session_id, None)
 
         if entry:
-            browser, *_ = entry
-            await browser.close()
+            await entry.browser.close()
+            if entry.user_data_dir:
+                await profile_templates.discard(entry.user_data_dir)
+
+    async def _on_disconnected(
+        self, session_id: str, browser: Union[Browser, BrowserContext],
+    ) -> None:
+        """Chromium went away without `close_browser` – free the slot now."""
+        async with self._lock:
+            entry = self._browsers.get(session_id)
+            if entry is None or entry.browser is not browser:
+                return                              # regular close, nothing to do
+            del self._browsers[session_id]
+
+        print(f"[worker] browser for {session_id} disconnected unexpectedly")
+        if entry.user_data_dir:
+            await profile_templates.discard(entry.user_data_dir)
+        if self.on_lost:
+            await self.on_lost(session_id, "browser_crashed")
@@ -0,0 +1,126 @@
+"""
+Per-session launch profiles: trade page fidelity for density.
+
+* Chromium flags  – images off, viewport, low-memory process model.
+* Warm template   – start from a pre-cached user-data-dir (profile_templates).
+* CDP-level blocks – `Network.setBlockedURLs` is injected by the worker's
+  relay (ws_proxy) into every page/worker target the client attaches to, so
+  blocks hold no matter which client library drives the browser.
+"""
+# worker/launch_profile.py
+from __future__ import annotations
+
+import itertools
+import json
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+ResourceType = Literal["image", "font", "media", "stylesheet"]
+
+# resource type → URL wildcards (Network.setBlockedURLs syntax)
+_TYPE_PATTERNS: dict[str, list[str]] = {
+    "font":       ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"],
+    "media":      ["*.mp4*", "*.webm*", "*.m3u8*", "*.mpd*", "*.m4s*",
+                   "*.mp3*", "*.m4a*", "*.ogg*", "*.wav*"],
+    "stylesheet": ["*.css*"],
+    # images are switched off in Blink itself (covers CSS backgrounds too)
+    "image":      [],
+}
+
+_LOW_MEMORY_ARGS = [
+    "--renderer-process-limit=2",
+    "--process-per-site",
+    "--disable-site-isolation-trials",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--mute-audio",
+    "--aggressive-cache-discard",
+    "--js-flags=--max-old-space-size=256",
+]
+
+# targets that own a network stack in Chromium
+_NETWORK_TARGETS = {"page", "iframe", "service_worker", "shared_worker"}
+
+# ids for commands the relay injects; far above anything a client uses
+_INJECTED_ID_BASE = 1 << 30
+
+
+class Viewport(BaseModel):
+    width: int = Field(1280, ge=200, le=7680)
+    height: int = Field(720, ge=200, le=4320)
+
+
+class LaunchProfile(BaseModel):
+    block_resource_types: list[ResourceType] = []
+    block_url_patterns: list[str] = []             # e.g. "*://*.doubleclick.net/*"
+    viewport: Viewport | None = None
+    low_memory: bool = False
+    template: str | None = Field(None, pattern=r"^[A-Za-z0-9_-]{1,64}$")
+
+    def chromium_args(self) -> list[str]:
+        args: list[str] = []
+        if "image" in self.block_resource_types:
+            args.append("--blink-settings=imagesEnabled=false")
+        if "media" in self.block_resource_types:
+            args.append("--autoplay-policy=user-gesture-required")
+        if self.viewport:
+            args.append(f"--window-size={self.viewport.width},{self.viewport.height}")
+        if self.low_memory:
+            args.extend(_LOW_MEMORY_ARGS)
+        return args
+
+    def blocked_url_patterns(self) -> list[str]:
+        patterns = list(self.block_url_patterns)
+        for rtype in self.block_resource_types:
+            patterns.extend(_TYPE_PATTERNS[rtype])
+        return patterns
+
+
+class BlockingInjector:
+    """
+    Sits on the Chrome → client leg of the relay.  For every
+    `Target.attachedToTarget` it returns the commands that install the URL
+    blocks on the new session, and it swallows the replies to those commands.
+    """
+
+    def __init__(self, patterns: list[str]) -> None:
+        self._patterns = patterns
+        self._ids = itertools.count(_INJECTED_ID_BASE)
+        self._pending: set[int] = set()
+
+    def on_browser_message(self, msg: str) -> tuple[bool, list[str]]:
+        """Returns (forward_to_client, commands_to_send_to_chrome)."""
+        if self._pending and '"id"' in msg:
+            # only while our commands are in flight; any key order / spacing
+            try:
+                msg_id = json.loads(msg).get("id")
+            except (ValueError, AttributeError):
+                msg_id = None
+            if msg_id in self._pending:
+                self._pending.discard(msg_id)
+                return False, []
+
+        # cheap substring test first – only attach events get parsed
+        if '"Target.attachedToTarget"' not in msg:
+            return True, []
+        params = json.loads(msg).get("params", {})
+        if params.get("targetInfo", {}).get("type") not in _NETWORK_TARGETS:
+            return True, []
+
+        session_id = params["sessionId"]
+        cmds = []
+        for method, p in (
+            ("Network.enable", {}),
+            ("Network.setBlockedURLs", {"urls": self._patterns}),
+        ):
+            cmd_id = next(self._ids)
+            self._pending.add(cmd_id)
+            cmds.append(json.dumps({
+                "id": cmd_id, "sessionId": session_id, "method": method, "params": p,
+            }))
+        return True, cmds
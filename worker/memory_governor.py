@@ -0,0 +1,276 @@
+"""
+Memory-pressure governor
+========================
+
+Watches the container's memory (cgroup v2 → cgroup v1 → /proc/meminfo) and
+acts before the kernel OOM-kills the whole worker:
+
+    pressure ≥ MEM_SOFT      → ask the largest browsers to shed memory
+                               (Memory.simulatePressureNotification +
+                               HeapProfiler.collectGarbage over CDP)
+    pressure ≥ MEM_HIGH      → mark this worker unschedulable in Redis
+    pressure ≥ MEM_CRITICAL  → close the single largest session
+
+Unschedulable is cleared again once pressure drops below MEM_SOFT, and on
+start-up (a restarted worker must not inherit its predecessor's flag).
+Every action is kept in a short history exposed by GET /memory.
+"""
+# worker/memory_governor.py
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import websockets
+
+SOFT: float = float(os.getenv("MEM_SOFT", "0.80"))
+HIGH: float = float(os.getenv("MEM_HIGH", "0.90"))
+CRITICAL: float = float(os.getenv("MEM_CRITICAL", "0.95"))
+CHECK_INTERVAL: float = float(os.getenv("MEMORY_CHECK_INTERVAL", "5"))
+RELIEF_TOP_N: int = int(os.getenv("MEM_RELIEF_SESSIONS", "3"))   # stage-1 fan-out
+RELIEF_COOLDOWN: float = 30.0    # CDP hints are not free either
+KILL_COOLDOWN: float = 15.0      # let freed memory show up before killing again
+
+STATE_REASON = "memory_pressure"
+_PAGE = os.sysconf("SC_PAGE_SIZE")
+_NO_LIMIT = 1 << 60              # cgroup v1 reports "unlimited" as a huge number
+
+# KEYS: workers_state, workers_load   ARGV: worker, reason
+# Only flag a worker that is still registered: a deregistered (drained)
+# worker must not be left with a stale entry.
+_SET_STATE_LUA = """
+if redis.call('ZSCORE', KEYS[2], ARGV[1]) then
+    return redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2])
+end
+return 0
+"""
+
+# KEYS: workers_state   ARGV: worker, reason
+# Only clear the flag we set – a drain must not be undone by us.
+_CLEAR_STATE_LUA = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call('HDEL', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+
+# ───────────────────────── memory readings ───────────────────────── #
+
+def _read(path: str) -> Optional[str]:
+    try:
+        return Path(path).read_text().strip()
+    except OSError:
+        return None
+
+
+def _stat_field(path: str, field: str) -> int:
+    for line in (_read(path) or "").splitlines():
+        k, _, v = line.partition(" ")
+        if k == field:
+            return int(v)
+    return 0
+
+
+def _meminfo() -> Tuple[int, int]:
+    info = {}
+    for line in (_read("/proc/meminfo") or "").splitlines():
+        k, _, v = line.partition(":")
+        info[k] = int(v.split()[0]) * 1024
+    return info["MemTotal"] - info["MemAvailable"], info["MemTotal"]
+
+
+def read_memory() -> Tuple[int, int]:
+    """(working-set bytes, limit bytes) – page cache is not counted."""
+    # cgroup v2
+    cur, limit = _read("/sys/fs/cgroup/memory.current"), _read("/sys/fs/cgroup/memory.max")
+    if cur and limit and limit != "max":
+        inactive = _stat_field("/sys/fs/cgroup/memory.stat", "inactive_file")
+        return int(cur) - inactive, int(limit)
+    # cgroup v1
+    cur = _read("/sys/fs/cgroup/memory/memory.usage_in_bytes")
+    limit = _read("/sys/fs/cgroup/memory/memory.limit_in_bytes")
+    if cur and limit and int(limit) < _NO_LIMIT:
+        inactive = _stat_field("/sys/fs/cgroup/memory/memory.stat", "total_inactive_file")
+        return int(cur) - inactive, int(limit)
+    # no container limit → whole machine
+    return _meminfo()
+
+
+def _process_table() -> Tuple[Dict[int, int], Dict[int, int], Dict[int, str]]:
+    """pid → ppid, pid → rss bytes, pid → cmdline, from one /proc walk."""
+    ppid, rss, cmd = {}, {}, {}
+    for d in Path("/proc").iterdir():
+        if not d.name.isdigit():
+            continue
+        pid = int(d.name)
+        try:
+            stat = (d / "stat").read_text()
+            ppid[pid] = int(stat.rsplit(")", 1)[1].split()[1])
+            rss[pid] = int((d / "statm").read_text().split()[1]) * _PAGE
+            cmd[pid] = (d / "cmdline").read_bytes().replace(b"\0", b" ").decode(errors="replace")
+        except (OSError, IndexError, ValueError):
+            continue                         # process exited mid-walk
+    return ppid, rss, cmd
+
+
+def session_rss(ports: Dict[str, int]) -> Dict[str, int]:
+    """sid → RSS of its Chromium process tree (found by debug port)."""
+    ppid, rss, cmd = _process_table()
+    children: Dict[int, list] = {}
+    for pid, parent in ppid.items():
+        children.setdefault(parent, []).append(pid)
+
+    by_port = {f"--remote-debugging-port={p} ": sid for sid, p in ports.items()}
+    roots: Dict[int, str] = {}
+    for pid, line in cmd.items():
+        line += " "
+        for flag, sid in by_port.items():
+            if flag in line:
+                roots[pid] = sid
+                break
+
+    out: Dict[str, int] = {}
+    for pid, sid in roots.items():
+        if roots.get(ppid.get(pid)) == sid:
+            continue                         # counted with its parent
+        total, stack = 0, [pid]
+        while stack:
+            p = stack.pop()
+            total += rss.get(p, 0)
+            stack.extend(children.get(p, ()))
+        out[sid] = out.get(sid, 0) + total
+    return out
+
+
+# ───────────────────────── CDP relief ───────────────────────── #
+
+async def _relieve(port: int, guid: str) -> None:
+    """Ask one browser to drop caches and GC every page's JS heap."""
+    async with websockets.connect(
+        f"ws://127.0.0.1:{port}/devtools/browser/{guid}",
+        max_size=None, compression=None,
+    ) as ws:
+        ids = iter(range(1, 1_000_000))
+
+        async def call(method: str, params: dict | None = None, session: str | None = None):
+            msg_id = next(ids)
+            msg = {"id": msg_id, "method": method, "params": params or {}}
+            if session:
+                msg["sessionId"] = session
+            await ws.send(json.dumps(msg))
+            while True:                      # skip events until our reply
+                reply = json.loads(await ws.recv())
+                if reply.get("id") == msg_id:
+                    return reply.get("result", {})
+
+        await call("Memory.simulatePressureNotification", {"level": "critical"})
+        targets = (await call("Target.getTargets"))["targetInfos"]
+        for t in targets:
+            if t["type"] != "page":
+                continue
+            sess = (await call("Target.attachToTarget",
+                               {"targetId": t["targetId"], "flatten": True}))["sessionId"]
+            await call("HeapProfiler.collectGarbage", session=sess)
+            await call("Target.detachFromTarget", {"sessionId": sess})
+
+
+# ───────────────────────── governor ───────────────────────── #
+
+class MemoryGovernor:
+    def __init__(
+        self, manager, redis, worker_host: str, state_key: str, load_key: str,
+        draining=lambda: False,
+    ) -> None:
+        self._bm = manager
+        self._redis = redis
+        self._host = worker_host
+        self._state_key = state_key
+        self._load_key = load_key
+        self._draining = draining
+        self._set_state = redis.register_script(_SET_STATE_LUA)
+        self._clear_state = redis.register_script(_CLEAR_STATE_LUA)
+        self._actions: deque = deque(maxlen=50)
+        self._last_relief = 0.0
+        self._last_kill = 0.0
+        self._status: dict = {}
+        self.schedulable = True
+
+    def _record(self, action: str, **details) -> None:
+        entry = {"ts": time.time(), "action": action, **details}
+        self._actions.append(entry)
+        print(f"[memory] {action} {details}")
+
+    def status(self) -> dict:
+        return {
+            **self._status,
+            "thresholds": {"soft": SOFT, "high": HIGH, "critical": CRITICAL},
+            "schedulable": self.schedulable,
+            "actions": list(self._actions),
+        }
+
+    async def check_once(self) -> None:
+        used, limit = read_memory()
+        pressure = used / limit if limit else 0.0
+        stage = 3 if pressure >= CRITICAL else 2 if pressure >= HIGH else 1 if pressure >= SOFT else 0
+
+        ports = {sid: port for sid, (port, _) in (await self._bm.endpoints()).items()}
+        sizes = await asyncio.to_thread(session_rss, ports) if stage else {}
+        largest = sorted(sizes, key=sizes.get, reverse=True)
+
+        self._status = {
+            "used_bytes": used, "limit_bytes": limit,
+            "pressure": round(pressure, 3), "stage": stage,
+            "largest_sessions": [{"session_id": s, "rss_bytes": sizes[s]} for s in largest[:5]],
+        }
+
+        # stage 1 – ask the biggest browsers to shed memory
+        if stage >= 1 and time.time() - self._last_relief > RELIEF_COOLDOWN:
+            self._last_relief = time.time()
+            for sid in largest[:RELIEF_TOP_N]:
+                info = await self._bm.get_info(sid)
+                if not info:
+                    continue
+                try:
+                    await asyncio.wait_for(_relieve(*info), timeout=5)
+                    self._record("relieve", session_id=sid, rss_bytes=sizes[sid])
+                except Exception as exc:
+                    self._record("relieve_failed", session_id=sid, error=str(exc))
+
+        # stage 2 – stop new placements (hysteresis: resume below SOFT)
+        if stage >= 2 and self.schedulable and not self._draining():
+            await self._set_state(keys=[self._state_key, self._load_key],
+                                  args=[self._host, STATE_REASON])
+            self.schedulable = False
+            self._record("unschedulable", pressure=round(pressure, 3))
+        elif stage == 0 and not self.schedulable:
+            await self._clear_state(keys=[self._state_key], args=[self._host, STATE_REASON])
+            self.schedulable = True
+            self._record("schedulable", pressure=round(pressure, 3))
+
+        # stage 3 – last resort: the worst offender goes
+        if stage >= 3 and largest and time.time() - self._last_kill > KILL_COOLDOWN:
+            victim = largest[0]
+            self._last_kill = time.time()
+            await self._bm.close_browser(victim)
+            self._record("terminated", session_id=victim, rss_bytes=sizes[victim])
+            if self._bm.on_lost:
+                await self._bm.on_lost(victim, STATE_REASON)
+
+    async def run(self) -> None:
+        """Runs forever."""
+        # a previous incarnation (OOM-killed, restarted) may have left our flag
+        if await self._clear_state(keys=[self._state_key], args=[self._host, STATE_REASON]):
+            self._record("schedulable", reason="stale flag cleared at start-up")
+        while True:
+            try:
+                await self.check_once()
+            except Exception as exc:
+                # never break the loop
+                print(f"[memory] check failed: {exc}")
+            await asyncio.sleep(CHECK_INTERVAL)
@@ -0,0 +1,254 @@
+"""
+Warm profile templates
+======================
+
+A template is a Chromium user-data-dir with a pre-populated HTTP disk cache
+(and whatever preferences it was saved with).  Sessions that ask for one get
+a private copy-on-write clone, so the first navigation to the usual target
+sites skips re-downloading their heavy JS/CSS bundles.
+
+Layout under PROFILE_TEMPLATES_DIR::
+
+    <name>/warm_urls.txt          URLs visited on refresh (one per line)
+    <name>/gen-<ns>-<rand>/       immutable snapshots
+    <name>/current  → gen-…       atomically swapped symlink
+    <name>/.refresh.lock          flock: one refresher per template
+
+Clones use `cp --reflink=auto`: a true CoW clone on btrfs/XFS (reflink=1),
+a full copy elsewhere.  Reflinks only work within one filesystem, so the
+per-session clones live next to the templates (PROFILE_SESSIONS_DIR,
+default `<PROFILE_TEMPLATES_DIR>/../sessions/<hostname>`) and start-up logs
+a warning when the volume cannot reflink.  Hardlinks are *not* used –
+Chromium rewrites cache files in place and would corrupt the template.
+
+Every worker replica mounts the same volume and runs the refresh loop; the
+lock file makes the others skip a template that is already being rebuilt.
+The loop also builds the first generation of any template directory that
+has none yet, so templates can be added without restarting the workers.
+"""
+# worker/profile_templates.py
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import os
+import re
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+TEMPLATES_DIR = Path(os.getenv("PROFILE_TEMPLATES_DIR", "/var/lib/browser-templates"))
+# same filesystem as the templates, one subdirectory per worker container
+SESSIONS_DIR = Path(os.getenv("PROFILE_SESSIONS_DIR")
+                    or TEMPLATES_DIR.parent / "sessions" / socket.gethostname())
+REFRESH_INTERVAL: int = int(os.getenv("PROFILE_TEMPLATE_REFRESH", "0"))   # s, 0 = off
+SCAN_INTERVAL: int = int(os.getenv("PROFILE_TEMPLATE_SCAN", "60"))         # s, new templates
+KEEP_GENERATIONS: int = 2        # the previous one may still be mid-clone
+
+NAME_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# per-run state Chromium must not inherit from the snapshot
+_LOCK_FILES = ("SingletonLock", "SingletonSocket", "SingletonCookie")
+
+
+class TemplateNotFound(LookupError):
+    pass
+
+
+class RefreshInProgress(RuntimeError):
+    pass
+
+
+def _current(name: str) -> Path:
+    if not NAME_RE.match(name):
+        raise TemplateNotFound(name)
+    path = TEMPLATES_DIR / name / "current"
+    if not path.exists():
+        raise TemplateNotFound(name)
+    return path.resolve()
+
+
+def refreshing(name: str) -> bool:
+    """True while some worker holds the template's refresh lock."""
+    try:
+        with _refresh_lock(_root(name)):
+            return False
+    except RefreshInProgress:
+        return True
+
+
+async def _cp_reflink(src: Path, dst: Path) -> None:
+    proc = await asyncio.create_subprocess_exec(
+        "cp", "-a", "--reflink=auto", str(src), str(dst),
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, err = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"clone {src} → {dst} failed: {err.decode().strip()}")
+    for f in _LOCK_FILES:
+        (dst / f).unlink(missing_ok=True)
+
+
+def prepare_sessions_dir() -> bool:
+    """
+    Start-up: drop clones left by a previous run of this container and
+    report whether clones will really be copy-on-write.
+    """
+    shutil.rmtree(SESSIONS_DIR, ignore_errors=True)
+    SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    ok = False
+    try:
+        with tempfile.NamedTemporaryFile(dir=SESSIONS_DIR) as probe:
+            probe.write(b"reflink probe")
+            probe.flush()
+            ok = subprocess.run(
+                ["cp", "--reflink=always", probe.name, probe.name + ".clone"],
+                capture_output=True,
+            ).returncode == 0
+            Path(probe.name + ".clone").unlink(missing_ok=True)
+    except OSError:
+        pass
+    if TEMPLATES_DIR.exists() and TEMPLATES_DIR.stat().st_dev != SESSIONS_DIR.stat().st_dev:
+        ok = False
+        print(f"[templates] {SESSIONS_DIR} is not on the templates' filesystem")
+    if not ok:
+        print(f"[templates] WARNING: no reflink support under {SESSIONS_DIR}; "
+              "template clones will be full copies")
+    return ok
+
+
+async def clone(name: str, session_id: str) -> Path:
+    """Private user-data-dir for one session, cloned from template `name`."""
+    src = _current(name)
+    dst = SESSIONS_DIR / session_id
+    SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    await _cp_reflink(src, dst)
+    return dst
+
+
+async def discard(user_data_dir: Path) -> None:
+    await asyncio.to_thread(shutil.rmtree, user_data_dir, True)
+
+
+@contextmanager
+def _refresh_lock(root: Path):
+    """Non-blocking flock shared by every worker mounting the volume."""
+    fd = os.open(root / ".refresh.lock", os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise RefreshInProgress(root.name) from None
+        yield
+    finally:
+        os.close(fd)                 # releases the lock
+
+
+def _root(name: str) -> Path:
+    root = TEMPLATES_DIR / name
+    if not NAME_RE.match(name) or not root.is_dir():
+        raise TemplateNotFound(name)
+    return root
+
+
+def list_templates() -> list[dict]:
+    out = []
+    if not TEMPLATES_DIR.is_dir():
+        return out
+    for d in sorted(TEMPLATES_DIR.iterdir()):
+        cur = d / "current"
+        if NAME_RE.match(d.name) and cur.exists():
+            gen = cur.resolve()
+            out.append({
+                "name": d.name,
+                "generation": gen.name,
+                "age_s": int(time.time() - gen.stat().st_mtime),
+            })
+    return out
+
+
+def _unbuilt() -> list[str]:
+    """Template directories that have no generation yet."""
+    if not TEMPLATES_DIR.is_dir():
+        return []
+    return [d.name for d in sorted(TEMPLATES_DIR.iterdir())
+            if NAME_RE.match(d.name) and d.is_dir() and not (d / "current").exists()]
+
+
+async def refresh(name: str, pw) -> str:
+    """
+    Build a new generation: clone the current one (if any), browse the warm
+    URLs so the disk cache fills up, then swap `current` atomically.
+    """
+    root = _root(name)                      # templates are created by hand, never here
+    with _refresh_lock(root):
+        return await _refresh_locked(name, root, pw)
+
+
+async def _refresh_locked(name: str, root: Path, pw) -> str:
+    urls_file = root / "warm_urls.txt"
+    urls = [u.strip() for u in urls_file.read_text().splitlines() if u.strip()] \
+        if urls_file.exists() else []
+
+    # unique even if two hosts refresh in the same second; sorts by time
+    staging = root / f"gen-{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+    if (root / "current").exists():
+        await _cp_reflink(_current(name), staging)
+
+    ctx = await pw.chromium.launch_persistent_context(
+        str(staging), headless=True,
+        args=["--no-sandbox", "--disable-dev-shm-usage"],
+    )
+    try:
+        page = await ctx.new_page()
+        for url in urls:
+            try:
+                await page.goto(url, wait_until="load", timeout=30_000)
+            except Exception as exc:
+                print(f"[templates] {name}: warming {url} failed: {exc}")
+    finally:
+        await ctx.close()           # flushes cache index + preferences
+    for f in _LOCK_FILES:
+        (staging / f).unlink(missing_ok=True)
+
+    # atomic swap: rename a fresh symlink over the old one
+    tmp_link = root / f"current.{os.getpid()}.tmp"
+    tmp_link.unlink(missing_ok=True)
+    tmp_link.symlink_to(staging.name)
+    os.replace(tmp_link, root / "current")
+
+    # a generation left behind by a refresher that died is pruned here too
+    gens = sorted(p for p in root.iterdir() if p.name.startswith("gen-"))
+    for old in gens[:-KEEP_GENERATIONS]:
+        if old.name != staging.name:     # never the one `current` points to
+            await discard(old)
+
+    print(f"[templates] {name}: refreshed → {staging.name} ({len(urls)} urls)")
+    return staging.name
+
+
+async def refresh_loop(pw) -> None:
+    """
+    Runs forever.  Every SCAN_INTERVAL seconds it builds templates that have
+    no generation yet and, if REFRESH_INTERVAL is set, re-warms the ones
+    older than that.
+    """
+    while True:
+        due = _unbuilt()
+        if REFRESH_INTERVAL > 0:
+            # age is shared through the volume: whoever is first refreshes
+            due += [t["name"] for t in list_templates() if t["age_s"] >= REFRESH_INTERVAL]
+        for name in due:
+            try:
+                await refresh(name, pw)
+            except (RefreshInProgress, TemplateNotFound):
+                continue                     # another replica has it / removed
+            except Exception as exc:
+                # never break the loop
+                print(f"[templates] {name}: refresh failed: {exc}")
+        await asyncio.sleep(SCAN_INTERVAL)
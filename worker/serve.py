@@ -0,0 +1,52 @@
+"""
+Worker entrypoint: uvicorn, with SIGTERM turned into a graceful drain.
+
+    python serve.py
+
+The first SIGTERM starts the drain (api.start_drain) instead of uvicorn's
+shutdown; once the worker is empty – or DRAIN_DEADLINE passed – the drain
+sets `should_exit` and uvicorn shuts down as usual (lifespan, exit code 0).
+A second SIGTERM, or SIGINT, shuts down right away.  Under plain
+`uvicorn api:app` SIGTERM is uvicorn's own: no drain, just deregistration.
+"""
+# worker/serve.py
+import asyncio
+import os
+import signal
+
+import uvicorn
+
+import api
+
+
+class DrainingServer(uvicorn.Server):
+    _loop: asyncio.AbstractEventLoop | None = None
+    _draining = False
+
+    async def serve(self, sockets=None) -> None:
+        self._loop = asyncio.get_running_loop()
+        api.request_exit = lambda: setattr(self, "should_exit", True)
+        await super().serve(sockets)
+
+    def handle_exit(self, sig, frame) -> None:
+        if sig != signal.SIGTERM or self._draining or self.should_exit or self._loop is None:
+            return super().handle_exit(sig, frame)
+        self._draining = True
+        print("[worker] SIGTERM: draining before exit (send again to stop now)")
+        self._loop.call_soon_threadsafe(lambda: self._loop.create_task(
+            api.start_drain(api.DRAIN_DEADLINE, exit_when_done=True)
+        ))
+
+
+def main() -> None:
+    DrainingServer(uvicorn.Config(
+        "api:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "5000")),
+        lifespan="on",
+        log_level=os.getenv("LOG_LEVEL", "info"),
+    )).run()
+
+
+if __name__ == "__main__":
+    main()
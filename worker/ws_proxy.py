@@ -3,7 +3,8 @@ import asyncio, websockets
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from websockets.exceptions import ConnectionClosedOK, ConnectionClosedError
 
-from browser_manager import BrowserManager          # ← the only import
+from browser_manager import BrowserManager
+from launch_profile import BlockingInjector
 
 router = APIRouter()
 
@@ -13,17 +14,21 @@ async def proxy_session(websocket: WebSocket, session_id: str):
 
     mgr = await BrowserManager.get()
     info = await mgr.get_info(session_id)            # (port, guid) or None
-    print("[proxy]", session_id, "info =", info, type(info[0]))
+    print("[proxy]", session_id, "info =", info)
     if info is None:
         await websocket.close(code=4404, reason="unknown session")
         return
 
+    profile = await mgr.get_profile(session_id)
+    patterns = profile.blocked_url_patterns() if profile else []
+    injector = BlockingInjector(patterns) if patterns else None
+
     port, guid   = info
     chrome_ws = f"ws://127.0.0.1:{port}/devtools/browser/{guid}"
 
     try:
         # leave ping_interval at the default (20 s) for TCP liveness
-        remote = await websockets.connect(chrome_ws, max_size=None)
+        remote = await websockets.connect(chrome_ws, max_size=None, compression=None)
     except Exception as exc:
         await websocket.close(code=1011, reason=str(exc))
         return
@@ -41,6 +46,12 @@ async def proxy_session(websocket: WebSocket, session_id: str):
     async def chrome_to_client():
         try:
             async for msg in remote:
+                if injector:
+                    forward, inject = injector.on_browser_message(msg)
+                    for cmd in inject:                # before the client sees the target
+                        await remote.send(cmd)
+                    if not forward:
+                        continue
                 await websocket.send_text(msg)
         except (ConnectionClosedOK, ConnectionClosedError):
             pass
@@ -55,4 +66,7 @@ async def proxy_session(websocket: WebSocket, session_id: str):
 
     # ───── clean-up ─────────────────────────────────────────────────────
     # Ensures we don’t leak a Chromium process if the client vanished.
-    await mgr.close_browser(session_id)
+    # Keep-alive sessions stay up: the gateway reaps them after the grace
+    # period via DELETE /browser/{id}.
+    if not await mgr.is_keep_alive(session_id):
+        await mgr.close_browser(session_id)